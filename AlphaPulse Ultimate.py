@@ -1,17 +1,98 @@
 import flet as ft
+import flet.canvas as cv
 import yfinance as yf
 import mplfinance as mpf
 import pandas as pd
+import numpy as np
 import sqlite3
+import os
+import re
+import hashlib
 import io
+import csv
+import json
 import base64
 import matplotlib
+import queue
+import random
 import threading
 import datetime
+import time
+import math
+import atexit
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from zoneinfo import ZoneInfo
+from yfinance.data import YfData  # yfinance 的共用請求器 (處理 cookie/crumb)，多檔報價端點使用
 
 # --- 0. 全局設定與常數 ---
 matplotlib.use('Agg')  # 設定無頭模式，避免彈出視窗
 DB_NAME = "alphapulse_v2.db"
+DEFAULT_LIST_NAME = "我的自選"
+MAX_WORKERS = 8  # 背景執行緒池上限 (網路請求 + 繪圖)
+DB_WRITE_BATCH_MAX = 256  # 寫入執行緒每個交易最多合併的寫入工作數
+DB_STATEMENT_CACHE = 128  # 每條連線保留的已編譯 SQL 語句數
+BAR_HISTORY_PERIOD = "6mo"   # 本地無資料時首次下載的日K區間
+CHART_LOOKBACK_DAYS = 183    # K 線圖顯示最近約半年
+BAR_TOPUP_INTERVAL = 300     # 盤中補抓日K的最短間隔 (秒)
+
+# 記憶體快取：各類資料的存活秒數與總筆數上限 (LRU 淘汰)
+CACHE_TTL = {
+    "quote": 15,            # 報價：秒級
+    "details": 6 * 3600,    # ticker.info：小時級
+    "news": 10 * 60,        # 新聞：分鐘級
+}
+CACHE_MAX_ENTRIES = 512          # 基本面 / 新聞 (分析頁逐檔查看)
+QUOTE_CACHE_MAX_ENTRIES = 4096   # 報價另設快取，千檔級清單也不會把基本面/新聞擠掉；過期報價留作斷路時的退路
+DETAILS_MAX_AGE = 24 * 3600  # 磁碟上的基本面超過此秒數即於背景重新抓取
+INDICATOR_STATE_MAX = 256    # 記憶體中保留逐根更新指標狀態的檔數上限 (LRU)
+
+# 對 Yahoo 的請求節流 (所有抓取路徑共用)：令牌桶限制平均速率、同時連線上限，
+# 暫時性錯誤 (含 429) 以抖動指數退避重試
+UPSTREAM_RATE = 8                 # 平均每秒請求數
+UPSTREAM_BURST = 20               # 閒置後可一次送出的請求數
+UPSTREAM_HOST_CONCURRENCY = 4     # 同時對 Yahoo 的連線上限
+UPSTREAM_RETRIES = 4
+UPSTREAM_BACKOFF = 1.0            # 第一次重試的退避上限 (秒)，之後每次加倍
+UPSTREAM_BACKOFF_MAX = 30.0
+# yf.Ticker 重用池 (共用同一個 keep-alive session)。Ticker 會記住 fast_info / info / news，
+# 存活時間不超過最短的快取 TTL，快取過期後重抓時必定拿到新的 Ticker
+TICKER_POOL_MAX = 64
+TICKER_MAX_AGE = CACHE_TTL["quote"]
+# 斷路器：連續多個請求 (各自重試用盡後) 失敗即停止對 Yahoo 發請求、改供應快取舊值，過一段時間於背景探測
+CIRCUIT_FAILURE_THRESHOLD = 5     # 以請求計，與 UPSTREAM_RETRIES 無關
+CIRCUIT_RESET_TIMEOUT = 30        # 斷路後多久送出探測 (秒)
+CIRCUIT_PROBE_SYMBOL = "SPY"
+
+# 自選股即時報價輪詢 (秒)：盤中只輪詢開盤中的市場，收盤後放慢
+QUOTE_POLL_INTERVAL = 5
+QUOTE_POLL_IDLE_INTERVAL = 300
+QUOTE_BATCH_SIZE = 50  # 列表刷新時每批報價的代碼數 (可視範圍通常一批即可)，多批時平行送出、先到先填
+QUOTE_URL = "https://query1.finance.yahoo.com/v7/finance/quote"  # 一次請求取回多檔報價
+QUOTE_REQUEST_MAX_SYMBOLS = 200  # 單一報價請求最多帶的代碼數 (URL 長度限制)
+
+# 自選股列表虛擬化：固定列高，只建立可視範圍 (上下各多 OVERSCAN 列) 的卡片
+WATCHLIST_ROW_HEIGHT = 76
+WATCHLIST_SPACING = 12
+WATCHLIST_PADDING = 20
+WATCHLIST_OVERSCAN = 6
+WATCHLIST_DEFAULT_ROWS = 10  # 尚不知視窗高度 (頁面未回報尺寸) 時假設的可視列數
+WATCHLIST_COMPACT_ROW_HEIGHT = 44
+WATCHLIST_COMPACT_THRESHOLD = 200  # 清單超過此檔數時自動改用精簡列
+
+# K 線圖後端："native" 以 Flet Canvas 原生繪製 (可縮放平移)；"image" 為 mplfinance PNG
+CHART_BACKEND = "native"
+CHART_WIDTH = 380
+CHART_HEIGHT = 360
+CHART_MAS = (5, 20, 60)
+CHART_MAX_ZOOM = 8
+
+# K 線圖輸出快取 (記憶體 + 磁碟)，K 棒沒變就不重跑 matplotlib
+CHART_STYLE = "nightclouds"
+CHART_DPI = 100
+CHART_CACHE_DIR = "chart_cache"
+CHART_CACHE_MAX_ENTRIES = 64
+CHART_CACHE_TTL = 24 * 3600
 
 # 色票系統 (Fintech 風格)
 class AppColors:
@@ -23,47 +104,706 @@ class AppColors:
     TEXT_MAIN = "#f8fafc"   # 主要文字
     TEXT_SUB = "#94a3b8"    # 次要文字
     DIVIDER = "#334155"
+    MA = {5: "#facc15", 20: "#a855f7", 60: "#38bdf8"}  # 均線顏色
 
 # --- 1. 模型層 (Model & Database) ---
 class DatabaseManager:
-    """處理所有 SQLite 資料庫操作"""
+    """處理所有 SQLite 資料庫操作
+
+    WAL 模式：所有寫入排入單一寫入執行緒，整批合併為一個交易提交，寫入方法立即回傳 Future；
+    讀取則使用各執行緒專屬的連線，可與寫入及彼此並行。
+    """
     def __init__(self):
-        self.conn = sqlite3.connect(DB_NAME, check_same_thread=False)
-        self.create_tables()
+        self._local = threading.local()
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._close_lock = threading.Lock()  # close() 與 _submit 互斥，停止標記之後不會再有寫入排入
+        self._conn = self._connect(check_same_thread=False, isolation_level=None)  # 交易由寫入執行緒自行控制
+        self._thread = threading.Thread(target=self._write_loop, name="db-writer", daemon=True)
+        self._thread.start()
+        self.default_list_id = self._submit(self._create_tables).result()
+
+    @staticmethod
+    def _connect(**kwargs):
+        conn = sqlite3.connect(DB_NAME, timeout=10, cached_statements=DB_STATEMENT_CACHE, **kwargs)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # WAL 下只在 checkpoint 時 fsync
+        return conn
+
+    def _reader(self):
+        """目前執行緒專屬的唯讀連線 (首次使用時建立)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def _read(self, sql, params=()):
+        return self._reader().execute(sql, params).fetchall()
+
+    def _submit(self, job, *args):
+        """排入寫入佇列：job(cursor, *args) 於寫入執行緒執行，Future 在交易提交後才完成"""
+        future = Future()
+        with self._close_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Cannot write to a closed DatabaseManager.")
+            self._queue.put((job, args, future))
+        return future
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < DB_WRITE_BATCH_MAX:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            self._commit_batch([item for item in batch if item is not None])
+            if stop: return
 
-    def create_tables(self):
-        cursor = self.conn.cursor()
+    def _commit_batch(self, batch):
+        """整批寫入合併為單一交易；個別工作失敗只回滾到自己的 savepoint"""
+        if not batch: return
+        cursor = self._conn.cursor()
+        results = []
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for job, args, future in batch:
+                cursor.execute("SAVEPOINT job")
+                try:
+                    results.append((future, job(cursor, *args), None))
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO job")
+                    print(f"DB Write Error: {e}")
+                    results.append((future, None, e))
+                cursor.execute("RELEASE job")
+            cursor.execute("COMMIT")
+        except sqlite3.Error as e:
+            print(f"DB Commit Error: {e}")
+            if self._conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            results = [(future, None, e) for _, _, future in batch]
+        for future, value, error in results:
+            if error is None:
+                future.set_result(value)
+            else:
+                future.set_exception(error)
+
+    def close(self):
+        """送出佇列中剩餘的寫入後停止寫入執行緒；之後的寫入會直接拋出例外"""
+        with self._close_lock:
+            if self._closed: return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _create_tables(self, cursor):
+        # 舊版單一自選清單，僅供首次遷移至多清單
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS watchlist (
                 symbol TEXT PRIMARY KEY,
                 added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
-        self.conn.commit()
+        # 具名自選清單與成員 (position 越小越上方)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS lists (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE,
+                position INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS list_members (
+                list_id INTEGER NOT NULL REFERENCES lists(id),
+                symbol TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (list_id, symbol)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_list_members_order ON list_members (list_id, position)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_list_members_symbol ON list_members (symbol)")
+        # 日K資料 (本地 OHLCV 倉庫)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS bars (
+                symbol TEXT NOT NULL,
+                date TEXT NOT NULL,
+                open REAL, high REAL, low REAL, close REAL, volume REAL,
+                PRIMARY KEY (symbol, date)
+            )
+        """)
+        # 每檔最後一次向 Yahoo 同步日K的時間
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS bar_sync (
+                symbol TEXT PRIMARY KEY,
+                synced_at REAL NOT NULL
+            )
+        """)
+        # 每檔最後一次成功取得的報價，冷啟動/離線時先顯示
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS quote_snapshot (
+                symbol TEXT PRIMARY KEY,
+                price REAL NOT NULL,
+                prev_close REAL NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        # 基本面 (ticker.info 摘要) 持久快取，跨重啟沿用
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS details_cache (
+                symbol TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        return self._migrate_watchlist(cursor)
+
+    @staticmethod
+    def _migrate_watchlist(cursor):
+        """首次啟動多清單版本時，建立預設清單並搬入舊 watchlist 表的內容 (維持新加入在上的順序)；回傳預設清單 id"""
+        cursor.execute("SELECT id FROM lists ORDER BY position, id LIMIT 1")
+        row = cursor.fetchone()
+        if row: return row[0]
+        cursor.execute("INSERT INTO lists (name, position) VALUES (?, 0)", (DEFAULT_LIST_NAME,))
+        list_id = cursor.lastrowid
+        cursor.execute("SELECT symbol FROM watchlist ORDER BY added_at DESC")
+        cursor.executemany(
+            "INSERT INTO list_members (list_id, symbol, position) VALUES (?, ?, ?)",
+            [(list_id, row[0], i) for i, row in enumerate(cursor.fetchall())]
+        )
+        return list_id
+
+    def get_lists(self):
+        """回傳 [(id, name)]"""
+        return self._read("SELECT id, name FROM lists ORDER BY position, id")
+
+    def create_list(self, name):
+        """新增清單；Future 結果為新 id，名稱重複則為 None"""
+        def job(cursor):
+            try:
+                cursor.execute("INSERT INTO lists (name, position) VALUES (?, (SELECT COALESCE(MAX(position), 0) + 1 FROM lists))", (name,))
+                return cursor.lastrowid
+            except sqlite3.IntegrityError:
+                return None
+        return self._submit(job)
+
+    def add_many_to_watchlist(self, symbols, list_id):
+        """批次加入 (依序排在清單最上方)，已存在者略過；Future 結果為實際新增筆數"""
+        def job(cursor):
+            cursor.execute("SELECT COALESCE(MIN(position), 0) FROM list_members WHERE list_id = ?", (list_id,))
+            top = cursor.fetchone()[0]
+            cursor.executemany(
+                "INSERT OR IGNORE INTO list_members (list_id, symbol, position) VALUES (?, ?, ?)",
+                [(list_id, s, top - len(symbols) + i) for i, s in enumerate(symbols)]
+            )
+            return cursor.rowcount
+        return self._submit(job)
+
+    def remove_from_watchlist(self, symbol, list_id):
+        return self._submit(lambda cursor: cursor.execute(
+            "DELETE FROM list_members WHERE list_id = ? AND symbol = ?", (list_id, symbol)).rowcount)
+
+    def get_watchlist(self, list_id):
+        rows = self._read("SELECT symbol FROM list_members WHERE list_id = ? ORDER BY position", (list_id,))
+        return [row[0] for row in rows]
+
+    def get_bar_sync(self, symbol):
+        """回傳 (最後一根日K日期, 同步時間 epoch)；尚未同步過則回傳 None"""
+        rows = self._read("""
+            SELECT (SELECT MAX(date) FROM bars WHERE symbol = ?), synced_at
+            FROM bar_sync WHERE symbol = ?
+        """, (symbol, symbol))
+        if not rows or rows[0][0] is None: return None
+        return rows[0]
+
+    def save_bars(self, symbol, df):
+        """合併新下載的日K (同日覆蓋) 並記錄同步時間；需要立即讀回時請等待回傳的 Future"""
+        rows = [
+            (symbol, idx.strftime("%Y-%m-%d"), float(r.Open), float(r.High), float(r.Low), float(r.Close), float(r.Volume))
+            for idx, r in zip(df.index, df.itertuples(index=False))
+        ]
+        synced_at = datetime.datetime.now().timestamp()
+        def job(cursor):
+            cursor.executemany("""
+                INSERT OR REPLACE INTO bars (symbol, date, open, high, low, close, volume)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            cursor.execute("INSERT OR REPLACE INTO bar_sync (symbol, synced_at) VALUES (?, ?)", (symbol, synced_at))
+        return self._submit(job)
 
-    def add_to_watchlist(self, symbol):
+    def get_bars(self, symbol, since=None):
+        """讀取本地日K，回傳與 yf.download 相同欄位的 DataFrame"""
+        rows = self._read("""
+            SELECT date, open, high, low, close, volume FROM bars
+            WHERE symbol = ? AND date >= ? ORDER BY date
+        """, (symbol, since or ""))
+        df = pd.DataFrame(rows, columns=["Date", "Open", "High", "Low", "Close", "Volume"])
+        df.index = pd.DatetimeIndex(pd.to_datetime(df.pop("Date")), name="Date")
+        return df
+
+    def save_quote_snapshots(self, quotes):
+        rows = [(q["symbol"], q["price"], q["prev_close"], q["as_of"]) for q in quotes]
+        if not rows: return None
+        return self._submit(lambda cursor: cursor.executemany("""
+            INSERT OR REPLACE INTO quote_snapshot (symbol, price, prev_close, fetched_at)
+            VALUES (?, ?, ?, ?)
+        """, rows))
+
+    def get_quote_snapshots(self, symbols):
+        """回傳 {symbol: (price, prev_close, fetched_at)}"""
+        # 代碼以 JSON 陣列傳入：不論檔數都是同一條已編譯語句，也沒有參數數量上限
+        rows = self._read("""
+            SELECT symbol, price, prev_close, fetched_at FROM quote_snapshot
+            WHERE symbol IN (SELECT value FROM json_each(?))
+        """, (json.dumps(list(symbols)),))
+        return {row[0]: row[1:] for row in rows}
+
+    def get_details_cache(self, symbol):
+        """回傳 (基本面 dict, 抓取時間 epoch)；無資料則回傳 None"""
+        rows = self._read("SELECT payload, fetched_at FROM details_cache WHERE symbol = ?", (symbol,))
+        if not rows: return None
+        return json.loads(rows[0][0]), rows[0][1]
+
+    def save_details_cache(self, symbol, details):
+        payload, fetched_at = json.dumps(details), time.time()
+        return self._submit(lambda cursor: cursor.execute(
+            "INSERT OR REPLACE INTO details_cache (symbol, payload, fetched_at) VALUES (?, ?, ?)",
+            (symbol, payload, fetched_at)))
+
+class WatchlistModel:
+    """記憶體中的自選清單 (set 判斷成員 + list 維持順序)：每個清單只從資料庫載入一次，
+    變動即時寫回 SQLite (不等待提交)，並通知訂閱者 listener(event, symbols)，event 為 add / remove / reset"""
+    def __init__(self, db, list_id):
+        self.db = db
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.load(list_id)
+
+    def load(self, list_id):
+        """切換清單：讀取一次並發出 reset"""
+        symbols = self.db.get_watchlist(list_id)
+        with self._lock:
+            self.list_id = list_id
+            self._order = symbols
+            self._members = set(symbols)
+        self._emit("reset", list(symbols))
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def _emit(self, event, symbols):
+        for listener in list(self._listeners):
+            try:
+                listener(event, symbols)
+            except Exception as e:
+                print(f"Watchlist Listener Error: {e}")
+
+    def __contains__(self, symbol):
+        return symbol in self._members
+
+    def __len__(self):
+        return len(self._members)
+
+    def symbols(self):
+        with self._lock:
+            return list(self._order)
+
+    def add_many(self, symbols):
+        """依序加入清單最上方，已存在者略過；回傳實際新增的代碼"""
+        with self._lock:
+            added = [s for s in dict.fromkeys(symbols) if s not in self._members]
+            if not added: return []
+            self.db.add_many_to_watchlist(added, self.list_id)  # 先排入寫入 (資料庫已關閉會拋出)，再改記憶體
+            self._members.update(added)
+            self._order[:0] = added
+        self._emit("add", added)
+        return added
+
+    def remove(self, symbol):
+        with self._lock:
+            if symbol not in self._members: return False
+            self.db.remove_from_watchlist(symbol, self.list_id)
+            self._members.discard(symbol)
+            self._order.remove(symbol)
+        self._emit("remove", [symbol])
+        return True
+
+    def toggle(self, symbol):
+        """加入或移除；回傳切換後是否在清單中"""
+        if self.remove(symbol): return False
+        self.add_many([symbol])
+        return True
+
+class WatchlistIO:
+    """自選股清單的匯入 (CSV / 純文字) 與匯出"""
+    HEADERS = ("symbol", "ticker", "code", "代碼", "股票代號")
+    SYMBOL_RE = re.compile(r"^[\^A-Za-z0-9.=-]{1,15}$")
+
+    @staticmethod
+    def read_file(path):
+        """讀取文字檔；Excel 存出的台灣 CSV 常為 cp950"""
+        for encoding in ("utf-8-sig", "cp950"):
+            try:
+                with open(path, encoding=encoding) as f:
+                    return f.read()
+            except UnicodeDecodeError:
+                continue
+        raise ValueError("無法辨識檔案編碼")
+
+    @classmethod
+    def parse(cls, text):
+        """取出代碼清單 (去重、保留順序)：CSV / TSV 取 symbol 欄 (無表頭取每列第一個詞)，純文字以空白/逗號分隔"""
+        lines = text.splitlines()
+        delimiter = "\t" if any("\t" in line for line in lines[:5]) else ","  # Excel 複製貼上為 Tab 分隔
+        rows = [row for row in csv.reader(lines, delimiter=delimiter) if any(cell.strip() for cell in row)]
+        if not rows: return []
+
+        header = [cell.strip().lower() for cell in rows[0]]
+        column = next((i for i, name in enumerate(header) if name in cls.HEADERS), None)
+        if column is not None:
+            codes = [row[column] for row in rows[1:] if len(row) > column]
+        else:
+            tokens = [token for row in rows for cell in row for token in cell.split()]
+            if all(cls.SYMBOL_RE.match(token) for token in tokens):
+                codes = tokens  # 純代碼清單 (逗號/空白/換行分隔)
+            else:
+                codes = [next(iter(row[0].split()), "") for row in rows]  # 無表頭的資料表：第一欄的第一個詞為代碼 ("2330 台積電")
+
+        symbols = (StockService.format_symbol(code) for code in codes)
+        return list(dict.fromkeys(s for s in symbols if s))
+
+    @staticmethod
+    def dump(symbols):
+        return "symbol\n" + "".join(f"{s}\n" for s in symbols)
+
+class MarketHours:
+    """各市場交易時段 (以交易所當地時間判斷，不含國定假日)"""
+    SESSIONS = {
+        "TW": ("Asia/Taipei", datetime.time(9, 0), datetime.time(13, 30)),
+        "HK": ("Asia/Hong_Kong", datetime.time(9, 30), datetime.time(16, 0)),
+        "US": ("America/New_York", datetime.time(9, 30), datetime.time(16, 0)),
+    }
+    SUFFIXES = {".TW": "TW", ".TWO": "TW", ".HK": "HK"}
+
+    @classmethod
+    def session_of(cls, symbol):
+        for suffix, market in cls.SUFFIXES.items():
+            if symbol.endswith(suffix):
+                return cls.SESSIONS[market]
+        return cls.SESSIONS["US"]
+
+    @staticmethod
+    def _now(tz_name):
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("INSERT INTO watchlist (symbol) VALUES (?)", (symbol,))
-            self.conn.commit()
-            return True
-        except sqlite3.IntegrityError:
-            return False
+            return datetime.datetime.now(ZoneInfo(tz_name))
+        except Exception:
+            return datetime.datetime.now().astimezone()  # 缺時區資料時退回本機時間
 
-    def remove_from_watchlist(self, symbol):
-        cursor = self.conn.cursor()
-        cursor.execute("DELETE FROM watchlist WHERE symbol = ?", (symbol,))
-        self.conn.commit()
+    @classmethod
+    def is_open(cls, symbol):
+        tz_name, open_t, close_t = cls.session_of(symbol)
+        now = cls._now(tz_name)
+        return now.weekday() < 5 and open_t <= now.time() < close_t
 
-    def get_watchlist(self):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT symbol FROM watchlist ORDER BY added_at DESC")
-        return [row[0] for row in cursor.fetchall()]
+    @classmethod
+    def last_close(cls, symbol):
+        """最近一次收盤的時間點 (aware datetime)"""
+        tz_name, _, close_t = cls.session_of(symbol)
+        now = cls._now(tz_name)
+        day = now.date()
+        if now.time() < close_t:
+            day -= datetime.timedelta(days=1)
+        while day.weekday() >= 5:
+            day -= datetime.timedelta(days=1)
+        return datetime.datetime.combine(day, close_t, tzinfo=now.tzinfo)
 
 # --- 2. 服務層 (Data Service) ---
+class TTLCache:
+    """執行緒安全的 TTL 快取，超過上限時淘汰最久未使用 (LRU) 的項目"""
+    def __init__(self, maxsize=CACHE_MAX_ENTRIES):
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= time.monotonic():
+                self.misses += 1  # 過期項目保留到被 LRU 淘汰，供 get_stale 使用
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def get_stale(self, key):
+        """不論是否過期都回傳 (上游無法連線時的退路)"""
+        with self._lock:
+            item = self._data.get(key)
+            return item[1] if item else None
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+class SingleFlight:
+    """合併並行的相同請求：同一 key 同時只有一個呼叫者 (leader) 真的去抓，其餘等待並共用其結果"""
+    def __init__(self):
+        self._calls = {}  # key -> Future
+        self._lock = threading.Lock()
+        self.shared = 0   # 被合併掉 (未重複發出) 的請求數
+
+    def claim(self, keys):
+        """回傳 (由本呼叫負責的 {key: Future}, 他人進行中的 {key: Future})"""
+        owned, pending = {}, {}
+        with self._lock:
+            for key in keys:
+                future = self._calls.get(key)
+                if future is None:
+                    owned[key] = self._calls[key] = Future()
+                else:
+                    pending[key] = future
+                    self.shared += 1
+        return owned, pending
+
+    def release(self, owned, results, error=None):
+        """結束 claim 取得的 key：等待者收到 results.get(key)，或一起收到 error"""
+        with self._lock:
+            for key in owned:
+                self._calls.pop(key, None)
+        for key, future in owned.items():
+            if error is None:
+                future.set_result(results.get(key))
+            else:
+                future.set_exception(error)
+
+    def do(self, key, fn, *args):
+        owned, pending = self.claim([key])
+        if pending:
+            return pending[key].result()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self.release(owned, {}, e)
+            raise
+        self.release(owned, {key: result})
+        return result
+
+class RateLimiter:
+    """令牌桶 + 同時連線上限：acquire() 先預約令牌 (額度不足時睡到輪到自己)，再等空出的連線槽"""
+    def __init__(self, rate=UPSTREAM_RATE, burst=UPSTREAM_BURST, concurrency=UPSTREAM_HOST_CONCURRENCY):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(concurrency)
+
+    def _reserve(self):
+        """扣一個令牌 (可透支)，回傳需等待的秒數；透支讓後到者自然排在後面"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait: time.sleep(wait)
+        self._slots.acquire()
+
+    def release(self):
+        self._slots.release()
+
+class CircuitOpenError(Exception):
+    """斷路中：不發請求直接失敗，由呼叫端改用快取"""
+
+class CircuitBreaker:
+    """上游健康狀態：closed 正常放行；連續失敗達門檻轉為 open，請求立即失敗；
+    open 超過 reset_timeout 後轉為 half_open 並呼叫 on_probe 於背景探測，探測成功才回到 closed"""
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, on_probe, threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.on_probe = on_probe
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.state != self.CLOSED
+
+    def allow(self):
+        """是否放行請求；斷路已達 reset_timeout 時觸發一次探測 (探測期間仍不放行)"""
+        with self._lock:
+            if self.state == self.CLOSED: return True
+            if self.state == self.HALF_OPEN or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+        self.on_probe()
+        return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print("Upstream Recovered")
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.threshold:
+                if self.state == self.CLOSED:
+                    print(f"Upstream Circuit Open after {self._failures} failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
 class StockService:
-    """處理 Yahoo Finance API 所有請求"""
-    
+    """處理 Yahoo Finance API 所有請求 (前置 TTL 快取，資料未過期不打網路；並行的相同請求只發一次)"""
+    def __init__(self, db, executor=None):
+        self.db = db
+        self.executor = executor  # 背景更新用；未提供則同步執行
+        self.cache = TTLCache()
+        self.quote_cache = TTLCache(maxsize=QUOTE_CACHE_MAX_ENTRIES)
+        self.flights = SingleFlight()
+        self.limiter = RateLimiter()
+        self.breaker = CircuitBreaker(on_probe=self._schedule_probe)
+        self.session = self._make_session()
+        self._tickers = TTLCache(maxsize=TICKER_POOL_MAX)
+        self.chart_cache = TTLCache(maxsize=CHART_CACHE_MAX_ENTRIES)
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._indicator_states = OrderedDict()  # symbol -> IndicatorState
+        self._indicator_lock = threading.Lock()
+
+    def _cached(self, kind, symbol, loader, fallback=None):
+        """先查快取，未命中才呼叫 loader (同一 key 並行時只呼叫一次)；空結果不快取以便下次重試。
+        loader 失敗 (或斷路中) 時改回 fallback(symbol)，預設為快取中已過期的舊值"""
+        key = (kind, symbol)
+        cache = self._cache_for(kind)
+        value = cache.get(key)
+        if value is None:
+            value = self.flights.do(key, self._load_into_cache, key, loader)
+        if not value:
+            value = fallback(symbol) if fallback else cache.get_stale(key)
+        return value
+
+    def _cache_for(self, kind):
+        return self.quote_cache if kind == "quote" else self.cache
+
+    def _load_into_cache(self, key, loader):
+        value = loader(key[1])
+        if value:
+            self._cache_for(key[0]).set(key, value, CACHE_TTL[key[0]])
+        return value
+
+    @staticmethod
+    def _make_session():
+        """所有 Yahoo 請求共用的 keep-alive session，連線與 cookie/crumb 只需建立一次。
+        curl_cffi (yfinance 首選後端) 每個執行緒保有自己的連線；退回 requests 時連線池對齊工作執行緒數"""
+        try:
+            from curl_cffi import requests as curl_requests
+            return curl_requests.Session(impersonate="chrome")
+        except ImportError:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS))
+            return session
+
+    def _ticker(self, symbol):
+        """從重用池取得 yf.Ticker (LRU，超過 TICKER_MAX_AGE 即換新)"""
+        ticker = self._tickers.get(symbol)
+        if ticker is None:
+            ticker = yf.Ticker(symbol, session=self.session)
+            self._tickers.set(symbol, ticker, TICKER_MAX_AGE)
+        return ticker
+
+    def _with_ticker(self, symbol, read):
+        """以池中的 Ticker 執行 read(ticker)；失敗時移出池子 (內部狀態可能只寫了一半)，重試改用新的"""
+        try:
+            return read(self._ticker(symbol))
+        except Exception:
+            self._tickers.pop(symbol)
+            raise
+
+    def _call_upstream(self, fn, *args, **kwargs):
+        """所有 Yahoo 請求的出口：經過限速，暫時性錯誤以 full-jitter 指數退避重試"""
+        for attempt in range(UPSTREAM_RETRIES + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError("Yahoo 暫時無法連線")
+            self.limiter.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not self._is_transient(e): raise
+                if attempt == UPSTREAM_RETRIES:
+                    self.breaker.record_failure()  # 重試用盡才算一次失敗，單一慢代碼不會直接斷路
+                    raise
+                if self.breaker.is_open: raise  # 其他請求已判定上游故障，不再重試
+                delay = random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF * 2 ** attempt))
+                print(f"Upstream Retry {attempt + 1} in {delay:.1f}s: {e}")
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                self.limiter.release()
+            time.sleep(delay)
+
+    def _schedule_probe(self):
+        if self.executor:
+            self.executor.submit(self._probe_upstream)
+        else:
+            self._probe_upstream()
+
+    def _probe_upstream(self):
+        """斷路器 half_open 時的探測：單次請求、不重試"""
+        self.limiter.acquire()
+        try:
+            self._with_ticker(CIRCUIT_PROBE_SYMBOL, lambda t: t.history(period="5d", raise_errors=True))
+        except Exception as e:
+            print(f"Upstream Probe Error: {e}")
+            self.breaker.record_failure()
+            return
+        finally:
+            self.limiter.release()
+        self.breaker.record_success()
+
+    @staticmethod
+    def _is_transient(error):
+        """限流 (429)、逾時、連線中斷與 5xx 值得重試；代碼不存在等錯誤則否"""
+        if type(error).__name__ == "YFRateLimitError" or isinstance(error, (TimeoutError, ConnectionError)):
+            return True
+        # requests / curl_cffi 的逾時與連線錯誤 (含 DNSError 等子類別)
+        if any("Timeout" in cls.__name__ or "Connection" in cls.__name__ for cls in type(error).__mro__):
+            return True
+        message = str(error)
+        return "Too Many Requests" in message or "Rate limited" in message or re.search(r"\b(429|50[0234])\b", message) is not None
+
+    def _history(self, symbol, **kwargs):
+        """單檔日K (raise_errors 讓限流等錯誤拋出而非回傳空表)"""
+        return self._call_upstream(self._with_ticker, symbol, lambda t: t.history(raise_errors=True, **kwargs))
+
     @staticmethod
     def format_symbol(code):
         code = code.strip().upper()
@@ -73,34 +813,187 @@ class StockService:
         return code
 
     @staticmethod
-    def get_quote(symbol):
+    def build_quote(symbol, price, prev_close, as_of=None, stale=False):
+        """由現價與昨收組出報價 dict；stale 表示來自本地快照而非即時取得"""
+        if not price or not prev_close: return None
+
+        change = price - prev_close
+        pct = (change / prev_close) * 100
+
+        return {
+            "symbol": symbol,
+            "price": price,
+            "change": change,
+            "pct": pct,
+            "prev_close": prev_close,
+            "as_of": as_of or time.time(),
+            "stale": stale
+        }
+
+    def snapshot_quotes(self, symbols):
+        """讀取本地最後已知報價 (標記為 stale)，不需網路"""
+        return {
+            s: self.build_quote(s, price, prev_close, as_of=fetched_at, stale=True)
+            for s, (price, prev_close, fetched_at) in self.db.get_quote_snapshots(symbols).items()
+        }
+
+    def get_quote(self, symbol):
+        """即時報價；上游失敗或斷路中則回傳最後已知報價 (stale)"""
+        return self._cached("quote", symbol, self._fetch_quote, fallback=lambda s: self._stale_quotes([s]).get(s))
+
+    def _stale_quotes(self, symbols):
+        """上游失敗時的退路：記憶體中已過期的報價，其次本地快照；一律標記 stale"""
+        quotes = {}
+        for s in symbols:
+            quote = self.quote_cache.get_stale(("quote", s))
+            if quote: quotes[s] = {**quote, "stale": True}
+        rest = [s for s in symbols if s not in quotes]
+        if rest:
+            quotes.update(self.snapshot_quotes(rest))
+        return quotes
+
+    def _remember_quotes(self, quotes):
+        """成功的報價寫入快取與本地快照"""
+        for quote in quotes:
+            self.quote_cache.set(("quote", quote["symbol"]), quote, CACHE_TTL["quote"])
+        try:
+            self.db.save_quote_snapshots(quotes)
+        except sqlite3.Error as e:
+            print(f"Snapshot Error: {e}")
+
+    def _fetch_quote(self, symbol):
         try:
-            ticker = yf.Ticker(symbol)
             # 使用 fast_info 獲取即時數據 (比 history 快)
-            price = ticker.fast_info.last_price
-            prev_close = ticker.fast_info.previous_close
-            
-            if not price: return None
-            
-            change = price - prev_close
-            pct = (change / prev_close) * 100
-            
-            return {
-                "symbol": symbol,
-                "price": price,
-                "change": change,
-                "pct": pct,
-                "prev_close": prev_close
-            }
-        except:
+            price, prev_close = self._call_upstream(self._with_ticker, symbol, self._read_fast_info)
+            quote = self.build_quote(symbol, price, prev_close)
+        except Exception as e:
+            print(f"Quote Error ({symbol}): {e}")
             return None
+        if quote:
+            self._remember_quotes([quote])
+        return quote
 
     @staticmethod
-    def get_details(symbol):
+    def _read_fast_info(ticker):
+        info = ticker.fast_info
+        return info.last_price, info.previous_close
+
+    def peek_quotes(self, symbols):
+        """只讀快取中仍有效的報價，不發任何網路請求"""
+        quotes = {}
+        for s in symbols:
+            quote = self.quote_cache.get(("quote", s))
+            if quote: quotes[s] = quote
+        return quotes
+
+    def get_quotes(self, symbols, refresh=False):
+        """批次報價：快取命中者直接回傳，其餘以多檔報價請求一次取回，回傳 {symbol: quote}；
+        refresh=True 略過快取讀取 (仍會寫回)，供即時輪詢使用。
+        其他呼叫正在抓的代碼不重複下載，等待並共用其結果"""
+        quotes = {}
+        missing = []
+        for s in dict.fromkeys(symbols):
+            quote = None if refresh else self.quote_cache.get(("quote", s))
+            if quote: quotes[s] = quote
+            else: missing.append(("quote", s))
+
+        owned, pending = self.flights.claim(missing)
+        fetched = {}
+        try:
+            fetched = self._fetch_quotes([key[1] for key in owned])
+            self._remember_quotes(list(fetched.values()))
+        finally:
+            self.flights.release(owned, {("quote", s): q for s, q in fetched.items()})
+        quotes.update(fetched)
+
+        for (_, s), future in pending.items():
+            quote = future.result()
+            if quote: quotes[s] = quote
+
+        failed = [key[1] for key in missing if key[1] not in quotes]
+        if failed:
+            quotes.update(self._stale_quotes(failed))
+        return quotes
+
+    def _fetch_quotes(self, symbols, raise_errors=False):
+        """每 QUOTE_REQUEST_MAX_SYMBOLS 檔一個多檔報價請求 (只花一個令牌)；限流等暫時性錯誤由
+        _call_upstream 只重試失敗的那一段。回應中沒有的代碼即 Yahoo 查無此代碼；
+        raise_errors=True 時某段請求失敗即拋出，不與查無代碼混為一談"""
+        quotes = {}
+        for i in range(0, len(symbols), QUOTE_REQUEST_MAX_SYMBOLS):
+            chunk = symbols[i:i + QUOTE_REQUEST_MAX_SYMBOLS]
+            try:
+                rows = self._call_upstream(self._request_quotes, chunk)
+            except Exception as e:
+                if raise_errors: raise
+                print(f"Batch Quote Error: {e}")
+                continue
+            wanted = {s.upper(): s for s in chunk}
+            for row in rows:
+                s = wanted.get(str(row.get("symbol", "")).upper())
+                if not s: continue
+                quote = self.build_quote(s, row.get("regularMarketPrice"), row.get("regularMarketPreviousClose"))
+                if quote:
+                    quotes[s] = quote
+        return quotes
+
+    def verify_symbols(self, symbols):
+        """匯入驗證：回傳 Yahoo 認得的代碼 (保持原順序)。曾取得報價者直接視為有效，其餘只有
+        Yahoo 回應中查無的才算無效；上游無法連線 (斷路中或重試用盡) 時拋出例外"""
+        symbols = list(dict.fromkeys(symbols))
+        known = set(self.snapshot_quotes(symbols))
+        known.update(s for s in symbols if self.quote_cache.get_stale(("quote", s)))
+        fetched = self._fetch_quotes([s for s in symbols if s not in known], raise_errors=True)
+        self._remember_quotes(list(fetched.values()))
+        return [s for s in symbols if s in known or s in fetched]
+
+    def _request_quotes(self, symbols):
+        data = YfData(session=self.session).get_raw_json(
+            QUOTE_URL, params={"symbols": ",".join(symbols), "formatted": "false"})
+        return (data.get("quoteResponse") or {}).get("result") or []
+
+    def get_details(self, symbol):
         """獲取詳細基本面資料"""
+        return self._cached("details", symbol, self._load_details)
+
+    def _load_details(self, symbol):
+        """磁碟快取優先 (跨重啟有效)；資料過舊時先回舊值，再於背景更新"""
+        stored = self.db.get_details_cache(symbol)
+        if not stored:
+            return self._refresh_details(symbol)
+
+        details, fetched_at = stored
+        if time.time() - fetched_at > DETAILS_MAX_AGE:
+            self._refresh_in_background(symbol)
+        return details
+
+    def _refresh_in_background(self, symbol):
+        with self._refresh_lock:
+            if symbol in self._refreshing: return
+            self._refreshing.add(symbol)
+
+        def task():
+            try:
+                self._refresh_details(symbol)
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(symbol)
+
+        if self.executor:
+            self.executor.submit(task)
+        else:
+            task()
+
+    def _refresh_details(self, symbol):
+        details = self._fetch_details(symbol)
+        if details:
+            self.db.save_details_cache(symbol, details)
+            self.cache.set(("details", symbol), details, CACHE_TTL["details"])
+        return details
+
+    def _fetch_details(self, symbol):
         try:
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
+            info = self._call_upstream(self._with_ticker, symbol, lambda t: t.info)
             return {
                 "name": info.get("longName", symbol),
                 "sector": info.get("sector", "N/A"),
@@ -111,75 +1004,548 @@ class StockService:
                 "high": info.get("dayHigh", 0),
                 "low": info.get("dayLow", 0),
             }
-        except:
+        except Exception as e:
+            print(f"Details Error ({symbol}): {e}")
             return None
 
-    @staticmethod
-    def get_news(symbol):
+    def get_news(self, symbol):
         """獲取新聞列表"""
+        return self._cached("news", symbol, self._fetch_news) or []
+
+    def _fetch_news(self, symbol):
         try:
-            ticker = yf.Ticker(symbol)
-            return ticker.news[:5] # 只取前5則
-        except:
+            return self._call_upstream(self._with_ticker, symbol, lambda t: t.news)[:5] # 只取前5則
+        except Exception as e:
+            print(f"News Error ({symbol}): {e}")
             return []
 
-    @staticmethod
-    def generate_chart_image(symbol):
-        """生成 K 線圖 Base64"""
+    def _download_bars(self, symbol, **kwargs):
+        df = self._history(symbol, interval="1d", auto_adjust=False, **kwargs)
+        return df[["Open", "High", "Low", "Close", "Volume"]].dropna()
+
+    def _bars_are_fresh(self, symbol, synced_at):
+        """盤中：距上次同步未滿 BAR_TOPUP_INTERVAL；盤後：收盤後已同步過"""
+        if MarketHours.is_open(symbol):
+            return datetime.datetime.now().timestamp() - synced_at < BAR_TOPUP_INTERVAL
+        return synced_at >= MarketHours.last_close(symbol).timestamp()
+
+    def get_bars(self, symbol, lookback_days=CHART_LOOKBACK_DAYS):
+        """日K資料：以本地 bars 表為主，只向 Yahoo 補抓最後一根 (含) 之後的資料；lookback_days=None 取全部"""
+        if not self.flights.do(("bars", symbol), self._sync_bars, symbol):
+            return pd.DataFrame(columns=["Open", "High", "Low", "Close", "Volume"])
+
+        if lookback_days is None:
+            return self.db.get_bars(symbol)
+        since = (datetime.date.today() - datetime.timedelta(days=lookback_days)).isoformat()
+        return self.db.get_bars(symbol, since=since)
+
+    def _sync_bars(self, symbol):
+        """把本地日K同步到最新；回傳本地是否有資料"""
+        sync = self.db.get_bar_sync(symbol)
+        if sync is None:
+            try:
+                df = self._download_bars(symbol, period=BAR_HISTORY_PERIOD)
+            except Exception as e:
+                print(f"Bar Download Error ({symbol}): {e}")
+                return False
+            if df.empty: return False
+            self.db.save_bars(symbol, df).result()  # 等寫入提交後再從本地讀回
+        else:
+            last_date, synced_at = sync
+            if not self._bars_are_fresh(symbol, synced_at):
+                # 重抓最後一根：盤中存下的可能是未收盤的 K 棒
+                try:
+                    self.db.save_bars(symbol, self._download_bars(symbol, start=last_date)).result()
+                except Exception as e:
+                    print(f"Bar Top-up Error: {e}")  # 補抓失敗仍以本地資料作圖
+        return True
+
+    def get_technicals(self, symbol, lookback_days=CHART_LOOKBACK_DAYS):
+        """日K + 技術指標 (以完整歷史計算)，回傳最近 lookback_days 的區段。
+        首次以向量化引擎建立狀態，之後只把補抓到的 K 棒逐根套進去。"""
+        window = self.get_bars(symbol, lookback_days)
+        if window.empty: return window, {}
+
+        with self._indicator_lock:
+            state = self._indicator_states.get(symbol)
+            if state is None:
+                state = IndicatorState.from_frame(self.db.get_bars(symbol))
+            else:
+                state.extend(self.db.get_bars(symbol, since=state.last_date.strftime("%Y-%m-%d")))
+            self._indicator_states[symbol] = state
+            self._indicator_states.move_to_end(symbol)
+            while len(self._indicator_states) > INDICATOR_STATE_MAX:
+                self._indicator_states.popitem(last=False)
+            return window, state.tail(len(window))
+
+    def generate_chart_image(self, symbol, technicals=None):
+        """生成 K 線圖 Base64 (依最後一根 K 棒、風格與 DPI 快取)；可傳入已算好的 (df, 指標)"""
         try:
-            df = yf.download(symbol, period="6mo", interval="1d", progress=False)
+            df, ind = technicals or self.get_technicals(symbol)
             if df.empty: return None
 
-            # 設定圖表風格
-            mc = mpf.make_marketcolors(up='r', down='g', inherit=True)
-            s = mpf.make_mpf_style(base_mpf_style='nightclouds', marketcolors=mc, gridstyle=':')
-            
-            buf = io.BytesIO()
-            mpf.plot(
-                df, 
-                type='candle', 
-                style=s, 
-                mav=(5, 20, 60), 
-                volume=True,
-                title=f'\n{symbol} Daily Chart',
-                savefig=dict(fname=buf, dpi=100, bbox_inches='tight', transparent=True),
-                ylabel='',     # 省略 Y 軸標籤以節省手機空間
-                ylabel_lower=''
-            )
-            buf.seek(0)
-            return base64.b64encode(buf.read()).decode()
+            # 最後一根 K 棒盤中仍會變動，連同收盤價與量一起納入 key
+            last = df.iloc[-1]
+            key = (symbol, df.index[-1].strftime("%Y-%m-%d"), float(last["Close"]), float(last["Volume"]), CHART_STYLE, CHART_DPI)
+            b64 = self.chart_cache.get(key)
+            if b64: return b64
+
+            png = self.flights.do(("chart",) + key, self._chart_png, symbol, key, df, ind)
+            b64 = base64.b64encode(png).decode()
+            self.chart_cache.set(key, b64, CHART_CACHE_TTL)
+            return b64
         except Exception as e:
             print(f"Chart Error: {e}")
             return None
 
+    def _chart_png(self, symbol, key, df, ind):
+        png = self._load_chart_file(symbol, key)
+        if png is None:
+            png = self._render_chart(symbol, df, ind)
+            self._save_chart_file(symbol, key, png)
+        return png
+
+    @staticmethod
+    def _chart_file_prefix(symbol):
+        """代碼轉成檔名：特殊字元改寫為 _XX (十六進位)，不同代碼 (如 A=F、A^F) 不會撞名"""
+        name = re.sub(r"[^A-Za-z0-9.-]", lambda m: f"_{ord(m.group()):02X}", symbol)
+        return os.path.join(CHART_CACHE_DIR, name + "_")
+
+    def _chart_path(self, symbol, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        return f"{self._chart_file_prefix(symbol)}{digest}.png"
+
+    def _load_chart_file(self, symbol, key):
+        try:
+            with open(self._chart_path(symbol, key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _save_chart_file(self, symbol, key, png):
+        """寫入新圖並清掉同一檔的舊圖，每檔只留最新一張"""
+        try:
+            os.makedirs(CHART_CACHE_DIR, exist_ok=True)
+            path = self._chart_path(symbol, key)
+            # 只比對 <prefix><16 碼雜湊>.png，避免 A 的前綴誤刪 A_3DF_… 等其他代碼的圖
+            pattern = re.compile(re.escape(os.path.basename(self._chart_file_prefix(symbol))) + r"[0-9a-f]{16}\.png")
+            for name in os.listdir(CHART_CACHE_DIR):
+                old = os.path.join(CHART_CACHE_DIR, name)
+                if pattern.fullmatch(name) and old != path:
+                    os.remove(old)
+            with open(path, "wb") as f:
+                f.write(png)
+        except OSError as e:
+            print(f"Chart Cache Error: {e}")
+
+    def _render_chart(self, symbol, df, ind):
+        # 設定圖表風格
+        mc = mpf.make_marketcolors(up='r', down='g', inherit=True)
+        s = mpf.make_mpf_style(base_mpf_style=CHART_STYLE, marketcolors=mc, gridstyle=':')
+        # 均線沿用指標引擎的結果，不再由 mplfinance 重算
+        mas = [
+            mpf.make_addplot(ind[f"sma_{n}"], color=AppColors.MA[n], width=1)
+            for n in CHART_MAS if not np.isnan(ind[f"sma_{n}"]).all()
+        ]
+        
+        buf = io.BytesIO()
+        mpf.plot(
+            df, 
+            type='candle', 
+            style=s, 
+            addplot=mas, 
+            volume=True,
+            title=f'\n{symbol} Daily Chart',
+            savefig=dict(fname=buf, dpi=CHART_DPI, bbox_inches='tight', transparent=True),
+            ylabel='',     # 省略 Y 軸標籤以節省手機空間
+            ylabel_lower=''
+        )
+        buf.seek(0)
+        return buf.read()
+
+class Indicators:
+    """NumPy 向量化技術指標：輸入為 float ndarray，輸出與輸入等長 (暖機期為 NaN)"""
+    MACD = (12, 26, 9)      # 快線、慢線、訊號線
+    BOLLINGER = (20, 2.0)   # 期數、標準差倍數
+    RSI_PERIOD = 14
+    ATR_PERIOD = 14
+
+    @staticmethod
+    def sma(x, n):
+        out = np.full(len(x), np.nan)
+        if len(x) >= n:
+            csum = np.cumsum(np.insert(x, 0, 0.0))
+            out[n - 1:] = (csum[n:] - csum[:-n]) / n
+        return out
+
+    @staticmethod
+    def ema(x, n=None, alpha=None):
+        """遞迴型 EMA (以首值起算，等同 pandas adjust=False)；遞迴部分交給 pandas 的 C 實作"""
+        alpha = alpha or 2.0 / (n + 1)
+        return pd.Series(x).ewm(alpha=alpha, adjust=False).mean().to_numpy(dtype=float, copy=True)
+
+    @classmethod
+    def rolling_std(cls, x, n):
+        """母體標準差，以累積和計算 E[x²] - E[x]²"""
+        mean = cls.sma(x, n)
+        var = cls.sma(x * x, n) - mean * mean
+        return np.sqrt(np.clip(var, 0.0, None))
+
+    @classmethod
+    def bollinger(cls, close, n=BOLLINGER[0], k=BOLLINGER[1]):
+        mid = cls.sma(close, n)
+        band = k * cls.rolling_std(close, n)
+        return mid, mid + band, mid - band
+
+    @staticmethod
+    def gains_losses(close):
+        """逐根漲幅與跌幅 (首根視為 0)"""
+        delta = np.diff(close, prepend=close[:1])
+        return np.clip(delta, 0.0, None), np.clip(-delta, 0.0, None)
+
+    @staticmethod
+    def true_range(high, low, close):
+        """真實波幅；首根以自身收盤當作前收"""
+        prev = np.concatenate((close[:1], close[:-1]))
+        return np.maximum(high - low, np.maximum(np.abs(high - prev), np.abs(low - prev)))
+
+    @classmethod
+    def rsi(cls, close, n=RSI_PERIOD):
+        """Wilder RSI (平滑係數 1/n)"""
+        gain, loss = cls.gains_losses(close)
+        avg_gain = cls.ema(gain, alpha=1.0 / n)
+        avg_loss = cls.ema(loss, alpha=1.0 / n)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+        out[avg_loss == 0] = 100.0
+        out[:n] = np.nan
+        return out
+
+    @classmethod
+    def macd(cls, close, fast=MACD[0], slow=MACD[1], signal=MACD[2]):
+        line = cls.ema(close, fast) - cls.ema(close, slow)
+        sig = cls.ema(line, signal)
+        return line, sig, line - sig
+
+    @classmethod
+    def atr(cls, high, low, close, n=ATR_PERIOD):
+        """Wilder ATR"""
+        out = cls.ema(cls.true_range(high, low, close), alpha=1.0 / n)
+        out[:n - 1] = np.nan
+        return out
+
+    @classmethod
+    def compute(cls, df):
+        """對整段日K一次算出所有指標，回傳 {名稱: ndarray}"""
+        high, low, close = (df[col].to_numpy(dtype=float) for col in ("High", "Low", "Close"))
+        ind = {f"sma_{n}": cls.sma(close, n) for n in CHART_MAS}
+        ind["macd"], ind["macd_signal"], ind["macd_hist"] = cls.macd(close)
+        ind["bb_mid"], ind["bb_upper"], ind["bb_lower"] = cls.bollinger(close)
+        ind["rsi_14"] = cls.rsi(close)
+        ind["atr_14"] = cls.atr(high, low, close)
+        return ind
+
+    @staticmethod
+    def latest(ind):
+        """各指標最後一筆數值 (NaN 轉為 None)"""
+        out = {}
+        for name, values in ind.items():
+            val = float(values[-1]) if len(values) else np.nan
+            out[name] = None if np.isnan(val) else val
+        return out
+
+class _RollingWindow:
+    """固定窗格均值/標準差：保留最近 n-1 根已確認值與其累計和，加上暫定值即為當根結果"""
+    def __init__(self, n):
+        self.n = n
+        self.values = deque()
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def seed(self, committed):
+        self.values = deque(float(v) for v in committed[max(0, len(committed) - (self.n - 1)):]) if self.n > 1 else deque()
+        self.total = sum(self.values)
+        self.total_sq = sum(v * v for v in self.values)
+
+    def peek(self, x):
+        if len(self.values) < self.n - 1: return math.nan, math.nan
+        mean = (self.total + x) / self.n
+        var = (self.total_sq + x * x) / self.n - mean * mean
+        return mean, math.sqrt(max(var, 0.0))
+
+    def push(self, x):
+        if self.n == 1: return
+        self.values.append(x)
+        self.total += x
+        self.total_sq += x * x
+        if len(self.values) > self.n - 1:
+            old = self.values.popleft()
+            self.total -= old
+            self.total_sq -= old * old
+
+class _Ema:
+    """遞迴平滑 (EMA / Wilder) 的單一承載值"""
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.value = None
+
+    def seed(self, committed):
+        self.value = float(Indicators.ema(committed, alpha=self.alpha)[-1]) if len(committed) else None
+
+    def peek(self, x):
+        return x if self.value is None else self.value + self.alpha * (x - self.value)
+
+    def push(self, x):
+        self.value = self.peek(x)
+
+class IndicatorState:
+    """逐根更新的指標狀態 (輸出欄位與 Indicators.compute 相同)。
+    已收盤的 K 棒累計在滾動狀態中，最後一根視為暫定 (盤中仍會變)；
+    新增或修正一根 K 棒，每個指標皆為 O(1)。"""
+    def __init__(self):
+        fast, slow, signal = Indicators.MACD
+        self.windows = {n: _RollingWindow(n) for n in set(CHART_MAS) | {Indicators.BOLLINGER[0]}}
+        self.ema_fast = _Ema(2.0 / (fast + 1))
+        self.ema_slow = _Ema(2.0 / (slow + 1))
+        self.ema_signal = _Ema(2.0 / (signal + 1))
+        self.avg_gain = _Ema(1.0 / Indicators.RSI_PERIOD)
+        self.avg_loss = _Ema(1.0 / Indicators.RSI_PERIOD)
+        self.avg_tr = _Ema(1.0 / Indicators.ATR_PERIOD)
+        self.prev_close = None
+        self.count = 0          # 已確認的 K 棒數
+        self.pending = None     # 暫定的最後一根 (date, high, low, close)
+        self.series = {}        # 指標名稱 -> list (含暫定值)
+
+    @classmethod
+    def from_frame(cls, df):
+        """以向量化引擎一次算出歷史序列，再由已確認的 K 棒推出滾動狀態"""
+        state = cls()
+        if df.empty: return state
+        high, low, close = (df[col].to_numpy(dtype=float) for col in ("High", "Low", "Close"))
+        state.series = {name: values.tolist() for name, values in Indicators.compute(df).items()}
+        state.pending = (df.index[-1], float(high[-1]), float(low[-1]), float(close[-1]))
+
+        h, l, c = high[:-1], low[:-1], close[:-1]
+        state.count = len(c)
+        if state.count:
+            for window in state.windows.values():
+                window.seed(c)
+            state.ema_fast.seed(c)
+            state.ema_slow.seed(c)
+            state.ema_signal.seed(Indicators.ema(c, Indicators.MACD[0]) - Indicators.ema(c, Indicators.MACD[1]))
+            gain, loss = Indicators.gains_losses(c)
+            state.avg_gain.seed(gain)
+            state.avg_loss.seed(loss)
+            state.avg_tr.seed(Indicators.true_range(h, l, c))
+            state.prev_close = float(c[-1])
+        return state
+
+    @property
+    def last_date(self):
+        return self.pending[0] if self.pending else None
+
+    def update(self, date, high, low, close):
+        """套用一根 K 棒：與暫定棒同日期即修正之，較新則先確認暫定棒再新增"""
+        if self.pending is not None:
+            if date < self.pending[0]: return  # 已確認的 K 棒不回頭修改
+            if date == self.pending[0]:
+                for values in self.series.values():
+                    values.pop()
+            else:
+                self._commit(*self.pending[1:])
+        self.pending = (date, high, low, close)
+        for name, val in self._peek(high, low, close).items():
+            self.series.setdefault(name, []).append(val)
+
+    def extend(self, df):
+        for date, h, l, c in zip(df.index, df["High"], df["Low"], df["Close"]):
+            self.update(date, float(h), float(l), float(c))
+
+    def tail(self, m):
+        """最後 m 筆指標 (ndarray)，與同長度的日K區段對齊"""
+        return {name: np.asarray(values[len(values) - m:], dtype=float) for name, values in self.series.items()}
+
+    def _peek(self, high, low, close):
+        out = {f"sma_{n}": self.windows[n].peek(close)[0] for n in CHART_MAS}
+
+        line = self.ema_fast.peek(close) - self.ema_slow.peek(close)
+        sig = self.ema_signal.peek(line)
+        out["macd"], out["macd_signal"], out["macd_hist"] = line, sig, line - sig
+
+        n, k = Indicators.BOLLINGER
+        mid, sd = self.windows[n].peek(close)
+        out["bb_mid"], out["bb_upper"], out["bb_lower"] = mid, mid + k * sd, mid - k * sd
+
+        prev = close if self.prev_close is None else self.prev_close
+        delta = close - prev
+        gain = self.avg_gain.peek(max(delta, 0.0))
+        loss = self.avg_loss.peek(max(-delta, 0.0))
+        if self.count < Indicators.RSI_PERIOD:
+            out["rsi_14"] = math.nan
+        else:
+            out["rsi_14"] = 100.0 if loss == 0 else 100.0 - 100.0 / (1.0 + gain / loss)
+
+        tr = max(high - low, abs(high - prev), abs(low - prev))
+        atr = self.avg_tr.peek(tr)
+        out["atr_14"] = math.nan if self.count < Indicators.ATR_PERIOD - 1 else atr
+        return out
+
+    def _commit(self, high, low, close):
+        for window in self.windows.values():
+            window.push(close)
+        line = self.ema_fast.peek(close) - self.ema_slow.peek(close)
+        self.ema_fast.push(close)
+        self.ema_slow.push(close)
+        self.ema_signal.push(line)
+
+        prev = close if self.prev_close is None else self.prev_close
+        delta = close - prev
+        self.avg_gain.push(max(delta, 0.0))
+        self.avg_loss.push(max(-delta, 0.0))
+        self.avg_tr.push(max(high - low, abs(high - prev), abs(low - prev)))
+        self.prev_close = close
+        self.count += 1
+
+class TaskExecutor:
+    """背景任務池：所有 StockService 呼叫都在此執行，結果再經 page.update() 推回畫面"""
+    def __init__(self, page=None, max_workers=MAX_WORKERS):
+        self.page = page
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="alphapulse")
+
+    def submit(self, fn, *args, on_result=None):
+        """排入背景執行；完成後在工作執行緒呼叫 on_result(result) 並刷新頁面"""
+        future = self._pool.submit(fn, *args)
+        if on_result:
+            future.add_done_callback(lambda f: self._deliver(f, on_result))
+        return future
+
+    def _deliver(self, future, on_result):
+        if future.cancelled(): return
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Task Error: {e}")
+            result = None
+        try:
+            on_result(result)
+            if self.page:
+                self.page.update()
+        except Exception as e:
+            print(f"Task Callback Error: {e}")
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+class QuoteStreamer:
+    """自選股報價輪詢迴圈 (獨立背景執行緒)：盤中每 interval 秒批次抓取開盤中的代碼，
+    收盤後每 idle_interval 秒抓一次全部；只把價格有變動的報價交給 on_quotes"""
+    def __init__(self, service, get_symbols, on_quotes, interval=QUOTE_POLL_INTERVAL, idle_interval=QUOTE_POLL_IDLE_INTERVAL):
+        self.service = service
+        self.get_symbols = get_symbols
+        self.on_quotes = on_quotes
+        self.interval = interval
+        self.idle_interval = idle_interval
+        self._last = {}  # symbol -> (price, prev_close, stale)
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """啟動 (或 stop 後重新啟動) 輪詢；每個執行緒有自己的停止旗標，舊執行緒收尾時不會擋住新的"""
+        if self._thread and self._thread.is_alive() and not self._stop.is_set(): return
+        self._stop = threading.Event()
+        self._wake.clear()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,), name="alphapulse-quotes", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self, stop):
+        last_full_poll = time.monotonic()  # 啟動時清單剛完整抓過
+        while not stop.is_set():
+            symbols = self.get_symbols()
+            targets = [s for s in symbols if MarketHours.is_open(s)]
+            if symbols and time.monotonic() - last_full_poll >= self.idle_interval:
+                targets = symbols
+                last_full_poll = time.monotonic()
+
+            if targets:
+                try:
+                    quotes = self.service.get_quotes(targets, refresh=True)
+                    # stale 也納入比較：上游斷線時同價的舊報價仍要送出，讓卡片改成離線樣式
+                    changed = {
+                        s: q for s, q in quotes.items()
+                        if self._last.get(s) != (q["price"], q["prev_close"], q.get("stale"))
+                    }
+                    self._last.update({s: (q["price"], q["prev_close"], q.get("stale")) for s, q in changed.items()})
+                    if changed:
+                        self.on_quotes(changed)
+                except Exception as e:
+                    print(f"Quote Stream Error: {e}")
+
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
 # --- 3. UI 組件層 (Components) ---
 class StockCard(ft.UserControl):
     """自選股列表中的單張卡片"""
     def __init__(self, symbol, data, on_delete_click, on_card_click):
         super().__init__()
         self.symbol = symbol
-        self.data = data
         self.on_delete_click = on_delete_click
         self.on_card_click = on_card_click
+        # 價格相關文字保留參考，報價更新時只改寫這幾個值
+        self.txt_prev = ft.Text(size=12, color=AppColors.TEXT_SUB)
+        self.txt_price = ft.Text(size=18, weight="bold", color=AppColors.TEXT_MAIN, text_align="right")
+        self.txt_change = ft.Text(size=14, weight="bold", text_align="right")
+        self.set_quote(data)
+
+    def set_quote(self, data):
+        """就地更新報價文字與顏色，不重建控制項 (呼叫端負責 update)；data 為 None 時顯示骨架"""
+        self.data = data
+        if data is None:
+            self.txt_prev.value = "Prev: —"
+            self.txt_price.value = "—"
+            self.txt_change.value = "載入中…"
+            self.txt_change.color = AppColors.TEXT_SUB
+            return
+        self.txt_prev.value = f"Prev: {data['prev_close']:.2f}"
+        if data.get("stale"):
+            # 本地快照：標示取得時間，價格以次要色顯示
+            as_of = datetime.datetime.fromtimestamp(data["as_of"]).strftime("%m/%d %H:%M")
+            self.txt_prev.value += f"  ⏱ {as_of}"
+        self.txt_price.color = AppColors.TEXT_SUB if data.get("stale") else AppColors.TEXT_MAIN
+        self.txt_price.value = f"${data['price']:.2f}"
+        self.txt_change.value = f"{data['change']:+.2f} ({data['pct']:+.2f}%)"
+        self.txt_change.color = AppColors.UP if data['change'] > 0 else AppColors.DOWN
+
+    def mark_unavailable(self):
+        if self.data is None:
+            self.txt_change.value = "無報價"
+
+    @property
+    def control(self):
+        return self
 
     def build(self):
-        color = AppColors.UP if self.data['change'] > 0 else AppColors.DOWN
-        icon = ft.icons.TRENDING_UP if self.data['change'] > 0 else ft.icons.TRENDING_DOWN
-        
         return ft.Container(
             padding=15,
+            height=WATCHLIST_ROW_HEIGHT,  # 固定列高供虛擬化列表計算位置
+            margin=ft.margin.only(bottom=WATCHLIST_SPACING),
             border_radius=15,
             bgcolor=AppColors.SURFACE,
             on_click=lambda e: self.on_card_click(self.symbol),
             content=ft.Row([
                 ft.Column([
                     ft.Text(self.symbol, size=18, weight="bold", color=AppColors.TEXT_MAIN),
-                    ft.Text(f"Prev: {self.data['prev_close']:.2f}", size=12, color=AppColors.TEXT_SUB),
+                    self.txt_prev,
                 ]),
                 ft.Row([
                     ft.Column([
-                        ft.Text(f"${self.data['price']:.2f}", size=18, weight="bold", color=AppColors.TEXT_MAIN, text_align="right"),
-                        ft.Text(f"{self.data['change']:+.2f} ({self.data['pct']:+.2f}%)", color=color, size=14, weight="bold", text_align="right"),
+                        self.txt_price,
+                        self.txt_change,
                     ], alignment="end"),
                     ft.IconButton(
                         icon=ft.icons.DELETE_OUTLINE, 
@@ -190,7 +1556,322 @@ class StockCard(ft.UserControl):
             ], alignment="spaceBetween")
         )
 
+class CompactStockRow:
+    """大型清單用的精簡列：Container + 單一 Row 共 5 個控制項，點擊 handler 由列表共用 (以 data 帶代碼)，
+    報價字串預先組好；本身以 __slots__ 儲存"""
+    __slots__ = ("symbol", "data", "control", "txt_quote")
+
+    def __init__(self, symbol, data, on_row_click, on_delete_click):
+        self.symbol = symbol
+        self.txt_quote = ft.Text(size=14, weight="bold", text_align="right")
+        self.control = ft.Container(
+            height=WATCHLIST_COMPACT_ROW_HEIGHT,
+            padding=ft.padding.only(left=12),
+            data=symbol,
+            on_click=on_row_click,
+            content=ft.Row([
+                ft.Text(symbol, size=15, weight="bold", color=AppColors.TEXT_MAIN, expand=True),
+                self.txt_quote,
+                ft.IconButton(icon=ft.icons.DELETE_OUTLINE, icon_size=18, icon_color=AppColors.TEXT_SUB,
+                              data=symbol, on_click=on_delete_click)
+            ])
+        )
+        self.set_quote(data)
+
+    def set_quote(self, data):
+        self.data = data
+        if data is None:
+            self.txt_quote.value = "— 載入中…"
+            self.txt_quote.color = AppColors.TEXT_SUB
+            return
+        text = f"{data['price']:.2f}  {data['change']:+.2f} ({data['pct']:+.2f}%)"
+        if data.get("stale"):
+            self.txt_quote.value = "⏱ " + text
+            self.txt_quote.color = AppColors.TEXT_SUB
+        else:
+            self.txt_quote.value = text
+            self.txt_quote.color = AppColors.UP if data['change'] > 0 else AppColors.DOWN
+
+    def mark_unavailable(self):
+        if self.data is None:
+            self.txt_quote.value = "無報價"
+
+class WatchlistView:
+    """虛擬化自選股列表：全部代碼與報價只存在資料層，僅可視範圍 (含預留列) 建成卡片；
+    上下各以一個 spacer 撐出完整捲動高度，捲動時以 symbol 為 key 對帳、重用既有卡片"""
+    def __init__(self, on_delete_click, on_card_click, on_rows_shown=None, compact=None):
+        self.on_delete_click = on_delete_click
+        self.on_card_click = on_card_click
+        self.on_rows_shown = on_rows_shown  # 新捲入可視範圍、尚無即時報價的代碼
+        self.compact = compact  # None 表示依 WATCHLIST_COMPACT_THRESHOLD 自動切換
+        self._rendered_compact = None
+        # 精簡列共用的 handler，避免每列各自持有 lambda
+        self._row_click = lambda e: self.on_card_click(e.control.data)
+        self._row_delete = lambda e: self.on_delete_click(e.control.data)
+        self.list_view = ft.ListView(expand=True, spacing=0, padding=WATCHLIST_PADDING,
+                                     on_scroll=self._on_scroll, on_scroll_interval=50)
+        self.top_spacer = ft.Container(height=0)
+        self.bottom_spacer = ft.Container(height=0)
+        self.order = []   # 全部代碼 (顯示順序)
+        self.members = set()
+        self.quotes = {}  # symbol -> 最新報價 (含未建卡片的列)
+        self.cards = {}   # symbol -> StockCard (僅可視窗格)
+        self.first = 0    # 可視範圍第一列
+        self.viewport_height = 0  # 可視區高度 (px)；列數依目前列高換算，切換精簡列時不需重新量測
+        self._lock = threading.RLock()
+
+    def symbols(self):
+        return list(self.order)
+
+    def is_compact(self):
+        return self.compact if self.compact is not None else len(self.order) > WATCHLIST_COMPACT_THRESHOLD
+
+    def set_compact(self, compact):
+        """切換卡片/精簡列，回傳需補抓報價的代碼"""
+        with self._lock:
+            self.compact = compact
+            return self._render()
+
+    @property
+    def visible_rows(self):
+        if not self.viewport_height:
+            return WATCHLIST_DEFAULT_ROWS
+        return math.ceil(self.viewport_height / self._row_pitch()) + 1
+
+    def set_viewport(self, height):
+        """依視窗高度 (啟動時與 page.on_resize) 調整可視列數；回傳因此新建、需補抓報價的代碼"""
+        with self._lock:
+            rows = self.visible_rows
+            self.viewport_height = height or 0
+            if self.visible_rows == rows: return []
+            return self._render() if self.order else []
+
+    def visible_symbols(self):
+        """可視範圍 (含預留列) 的代碼，報價抓取與輪詢以此為優先"""
+        with self._lock:
+            start, end = self._window()
+            return self.order[start:end]
+
+    def show_empty(self):
+        self.cards.clear()
+        self.list_view.controls = [
+            ft.Column([
+                ft.Icon(ft.icons.DASHBOARD_CUSTOMIZE, size=60, color=AppColors.TEXT_SUB),
+                ft.Text("尚無自選股", color=AppColors.TEXT_SUB),
+                ft.Text("請至「個股分析」頁面添加", color=AppColors.TEXT_SUB, size=12)
+            ], alignment="center", horizontal_alignment="center", expand=True)
+        ]
+
+    def reconcile(self, symbols, quotes):
+        """以新的代碼順序與報價對帳：資料層全部更新，畫面只重排可視窗格"""
+        with self._lock:
+            self.order = list(symbols)
+            self.members = set(self.order)
+            self.quotes = {s: q for s, q in self.quotes.items() if s in self.members}
+            self.quotes.update({s: q for s, q in quotes.items() if s in self.members})
+            for s, card in self.cards.items():
+                if s in quotes:
+                    card.set_quote(quotes[s])  # 報價失敗時沿用舊值，不讓卡片消失
+            self._render()
+
+    def remove(self, symbol):
+        """只移除單列，不觸發任何網路請求；回傳因此滑入可視範圍、需補抓報價的代碼"""
+        with self._lock:
+            if symbol not in self.members: return []
+            self.members.discard(symbol)
+            self.order.remove(symbol)
+            self.quotes.pop(symbol, None)
+            self.cards.pop(symbol, None)
+            return self._render()
+
+    def update_quotes(self, quotes, requested=()):
+        """填入報價；requested 中沒拿到報價、且仍是骨架的卡片標示為無報價"""
+        with self._lock:
+            for s, data in quotes.items():
+                if s not in self.members: continue
+                self.quotes[s] = data
+                card = self.cards.get(s)
+                if card:
+                    card.set_quote(data)
+            for s in requested:
+                card = self.cards.get(s)
+                if card and s not in quotes:
+                    card.mark_unavailable()
+
+    def _row_pitch(self):
+        if self.is_compact():
+            return WATCHLIST_COMPACT_ROW_HEIGHT
+        return WATCHLIST_ROW_HEIGHT + WATCHLIST_SPACING
+
+    def _make_row(self, symbol):
+        if self.is_compact():
+            return CompactStockRow(symbol, self.quotes.get(symbol), self._row_click, self._row_delete)
+        return StockCard(symbol, self.quotes.get(symbol), self.on_delete_click, self.on_card_click)
+
+    def _window(self):
+        start = max(0, self.first - WATCHLIST_OVERSCAN)
+        end = min(len(self.order), self.first + self.visible_rows + WATCHLIST_OVERSCAN)
+        return start, end
+
+    def _render(self):
+        """重建可視窗格，回傳新建卡片中尚無即時報價的代碼"""
+        if not self.order:
+            self.show_empty()
+            return []
+
+        if self._rendered_compact != self.is_compact():
+            self.cards.clear()  # 列型態改變，整個窗格重建
+            self._rendered_compact = self.is_compact()
+
+        start, end = self._window()
+        window = self.order[start:end]
+        keep = set(window)
+        for s in [s for s in self.cards if s not in keep]:
+            del self.cards[s]
+
+        rows, created = [], []
+        for s in window:
+            card = self.cards.get(s)
+            if card is None:
+                card = self._make_row(s)
+                self.cards[s] = card
+                created.append(s)
+            rows.append(card.control)
+
+        pitch = self._row_pitch()
+        self.top_spacer.height = start * pitch
+        self.bottom_spacer.height = (len(self.order) - end) * pitch
+        # 沿用同一批控制項物件，Flet 只會送出插入/移除的差異
+        self.list_view.controls = [self.top_spacer, *rows, self.bottom_spacer]
+        return [s for s in created if not self.quotes.get(s) or self.quotes[s].get("stale")]
+
+    def _on_scroll(self, e):
+        pitch = self._row_pitch()
+        first = max(0, int((e.pixels - WATCHLIST_PADDING) // pitch))
+        with self._lock:
+            rows = self.visible_rows
+            if e.viewport_dimension:
+                self.viewport_height = e.viewport_dimension
+            # 捲動未超過預留列的一半時沿用現有窗格
+            if abs(first - self.first) < WATCHLIST_OVERSCAN // 2 and self.visible_rows == rows: return
+            self.first = first
+            shown = self._render()
+        self.list_view.update()
+        if shown and self.on_rows_shown:
+            self.on_rows_shown(shown)
+
+class CandleChart(ft.UserControl):
+    """以 Flet Canvas 原生繪製的 K 線 + 成交量 + 均線，縮放平移在前端完成"""
+    VOLUME_RATIO = 0.22  # 下方成交量區佔整體高度比例
+    PAD = 16
+
+    def __init__(self, symbol, df, ind, width=CHART_WIDTH, height=CHART_HEIGHT):
+        super().__init__()
+        self.symbol = symbol
+        self.width = width
+        self.height = height
+        # 幾何運算在建構時 (背景執行緒) 完成，build() 只組裝控制項
+        self.shapes = self._build_shapes(df, ind)
+
+    def _build_shapes(self, df, ind):
+        o, h, l, c, v = (df[col].to_numpy(dtype=float) for col in ("Open", "High", "Low", "Close", "Volume"))
+        mas = {n: ind[f"sma_{n}"] for n in CHART_MAS}
+
+        n = len(c)
+        step = self.width / n
+        body_w = max(1.0, step * 0.6)
+        price_bottom = self.height * (1 - self.VOLUME_RATIO) - self.PAD
+        vol_top = self.height * (1 - self.VOLUME_RATIO)
+
+        lo, hi = float(l.min()), float(h.max())
+        span = (hi - lo) or 1.0
+        vmax = float(v.max()) or 1.0
+
+        def x(i): return (i + 0.5) * step
+        def y(p): return self.PAD + (hi - p) / span * (price_bottom - self.PAD)
+
+        shapes = []
+        for i in range(n):
+            color = AppColors.UP if c[i] >= o[i] else AppColors.DOWN
+            top, bottom = y(max(o[i], c[i])), y(min(o[i], c[i]))
+            shapes.append(cv.Line(x(i), y(h[i]), x(i), y(l[i]), paint=ft.Paint(color=color, stroke_width=1)))
+            shapes.append(cv.Rect(x(i) - body_w / 2, top, body_w, max(1.0, bottom - top),
+                                  paint=ft.Paint(color=color, style=ft.PaintingStyle.FILL)))
+            vol_h = v[i] / vmax * (self.height - vol_top)
+            shapes.append(cv.Rect(x(i) - body_w / 2, self.height - vol_h, body_w, vol_h,
+                                  paint=ft.Paint(color=ft.colors.with_opacity(0.5, color), style=ft.PaintingStyle.FILL)))
+
+        for period, values in mas.items():
+            elements = []
+            for i, val in enumerate(values):
+                if val != val: continue  # NaN (暖機期)
+                if not elements:
+                    elements.append(cv.Path.MoveTo(x(i), y(val)))
+                else:
+                    elements.append(cv.Path.LineTo(x(i), y(val)))
+            if elements:
+                shapes.append(cv.Path(elements, paint=ft.Paint(
+                    color=AppColors.MA[period], stroke_width=1.2, style=ft.PaintingStyle.STROKE)))
+
+        label = ft.TextStyle(size=10, color=AppColors.TEXT_SUB)
+        shapes.append(cv.Text(4, 0, f"{self.symbol} Daily  MA{'/'.join(map(str, CHART_MAS))}", style=label))
+        shapes.append(cv.Text(self.width - 4, self.PAD, f"{hi:.2f}", style=label, alignment=ft.alignment.top_right))
+        shapes.append(cv.Text(self.width - 4, price_bottom, f"{lo:.2f}", style=label, alignment=ft.alignment.bottom_right))
+        return shapes
+
+    def build(self):
+        canvas = cv.Canvas(self.shapes, width=self.width, height=self.height)
+        if hasattr(ft, "InteractiveViewer"):  # Flet 0.24+
+            return ft.InteractiveViewer(min_scale=1, max_scale=CHART_MAX_ZOOM, content=canvas)
+
+        # 舊版 Flet 沒有 InteractiveViewer：以 GestureDetector 自行處理縮放 (雙指/滾輪) 與平移
+        self._canvas = canvas
+        self._zoom, self._dx, self._dy = 1.0, 0.0, 0.0
+        self._start_zoom = 1.0
+        return ft.GestureDetector(
+            on_scale_start=self._on_scale_start,
+            on_scale_update=self._on_scale_update,
+            on_scroll=self._on_scroll,
+            content=ft.Container(canvas, width=self.width, height=self.height, clip_behavior=ft.ClipBehavior.HARD_EDGE)
+        )
+
+    def _on_scale_start(self, e):
+        self._start_zoom = self._zoom
+
+    def _on_scale_update(self, e):
+        self._transform(self._start_zoom * e.scale, e.focal_point_delta_x, e.focal_point_delta_y)
+
+    def _on_scroll(self, e):
+        if e.scroll_delta_y:
+            self._transform(self._zoom * (0.9 if e.scroll_delta_y > 0 else 1.1), 0, 0)
+
+    def _transform(self, zoom, dx, dy):
+        """以中心縮放後平移，平移量限制在放大後超出畫框的範圍內"""
+        self._zoom = min(CHART_MAX_ZOOM, max(1.0, zoom))
+        max_dx = (self._zoom - 1) * self.width / 2
+        max_dy = (self._zoom - 1) * self.height / 2
+        self._dx = min(max_dx, max(-max_dx, self._dx + dx))
+        self._dy = min(max_dy, max(-max_dy, self._dy + dy))
+        self._canvas.scale = ft.Scale(self._zoom)
+        self._canvas.offset = ft.Offset(self._dx / self.width, self._dy / self.height)
+        self._canvas.update()
+
 # --- 4. 主程式邏輯 (Main Controller) ---
+_shared = None
+_shared_lock = threading.Lock()
+
+def shared_services():
+    """行程層級共用的 (db, service)：第一個工作階段建立，之後所有工作階段共用快取、節流、斷路器與寫入執行緒；行程結束時關閉"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            db = DatabaseManager()
+            background = TaskExecutor()  # 服務自己的背景更新 / 探測，不綁定任何頁面
+            _shared = (db, StockService(db, background))
+            atexit.register(db.close)
+            atexit.register(background.shutdown)
+        return _shared
+
 def main(page: ft.Page):
     # --- 頁面初始化 ---
     page.title = "AlphaPulse Ultimate"
@@ -200,52 +1881,205 @@ def main(page: ft.Page):
     page.window_width = 420
     page.window_height = 880
 
-    db = DatabaseManager()
+    db, service = shared_services()
+    executor = TaskExecutor(page)  # 每個工作階段各自的任務池，結果推回自己的頁面
     
     # --- UI 狀態變數 ---
     current_symbol = None
+    watchlist_model = WatchlistModel(db, db.default_list_id)  # 目前顯示的自選清單 (記憶體成員表)
+    watchlist_generation = 0  # 只採用最新一次刷新的結果
 
     # --- 畫面元件宣告 ---
     
     # 1. 自選股列表視圖
-    lv_watchlist = ft.ListView(expand=True, spacing=12, padding=20)
+    watchlist = WatchlistView(
+        lambda symbol: on_delete_stock(symbol),
+        lambda symbol: load_analysis_page(symbol),
+        on_rows_shown=lambda symbols: fetch_watchlist_quotes(watchlist_generation, symbols)
+    )
     
     def refresh_watchlist():
-        lv_watchlist.controls.clear()
-        # 顯示載入中
-        lv_watchlist.controls.append(ft.ProgressBar(width=100, color=AppColors.PRIMARY, bgcolor=AppColors.SURFACE))
+        """先依資料庫清單立即畫出卡片 (快取有報價就直接填)，其餘分批平行抓取、逐批填入"""
+        nonlocal watchlist_generation
+        watchlist_generation += 1
+        generation = watchlist_generation
+
+        symbols = watchlist_model.symbols()
+        cached = service.peek_quotes(symbols)
+        # 快取沒有的先以本地最後已知報價 (stale) 顯示，首屏不必等網路
+        snapshots = service.snapshot_quotes([s for s in symbols if s not in cached])
+        watchlist.reconcile(symbols, {**snapshots, **cached})
         page.update()
-        
-        symbols = db.get_watchlist()
-        if not symbols:
-            lv_watchlist.controls.clear()
-            lv_watchlist.controls.append(
-                ft.Column([
-                    ft.Icon(ft.icons.DASHBOARD_CUSTOMIZE, size=60, color=AppColors.TEXT_SUB),
-                    ft.Text("尚無自選股", color=AppColors.TEXT_SUB),
-                    ft.Text("請至「個股分析」頁面添加", color=AppColors.TEXT_SUB, size=12)
-                ], alignment="center", horizontal_alignment="center", expand=True)
-            )
-        else:
-            lv_watchlist.controls.clear()
-            for s in symbols:
-                data = StockService.get_quote(s)
-                if data:
-                    card = StockCard(s, data, on_delete_stock, load_analysis_page)
-                    lv_watchlist.controls.append(card)
+
+        # 只抓可視範圍的報價，其餘列捲入畫面時再由 on_rows_shown 補抓
+        fetch_watchlist_quotes(generation, [s for s in watchlist.visible_symbols() if s not in cached])
+
+    def fetch_watchlist_quotes(generation, symbols):
+        for i in range(0, len(symbols), QUOTE_BATCH_SIZE):
+            batch = symbols[i:i + QUOTE_BATCH_SIZE]
+            executor.submit(service.get_quotes, batch, on_result=lambda quotes, batch=batch: on_quotes(generation, batch, quotes))
+
+    def on_quotes(generation, batch, quotes):
+        if generation != watchlist_generation: return  # 已有更新的刷新
+        watchlist.update_quotes(quotes or {}, requested=batch)
+
+    def on_stream_quotes(quotes):
+        """輪詢執行緒回呼：只改寫受影響卡片的價格文字"""
+        watchlist.update_quotes(quotes)
         page.update()
 
+    def streamed_symbols():
+        return watchlist.visible_symbols() if view_watchlist.visible else []
+
+    quote_streamer = QuoteStreamer(service, streamed_symbols, on_stream_quotes)
+
+    def on_watchlist_changed(event, symbols):
+        """清單變動 (任何來源)：移除只拿掉該列，只補抓因此滑入畫面的列；新增/切換清單則依記憶體清單重新 reconcile"""
+        if event == "remove":
+            shown = []
+            for symbol in symbols:
+                shown += watchlist.remove(symbol)
+            page.update()
+            fetch_watchlist_quotes(watchlist_generation, [s for s in dict.fromkeys(shown) if s in watchlist_model])
+        else:
+            refresh_watchlist()
+        if current_symbol:
+            update_fav_icon(current_symbol)
+
+    watchlist_model.subscribe(on_watchlist_changed)
+
     def on_delete_stock(symbol):
-        db.remove_from_watchlist(symbol)
-        refresh_watchlist()
+        watchlist_model.remove(symbol)
         page.show_snack_bar(ft.SnackBar(content=ft.Text(f"{symbol} 已移除"), bgcolor=AppColors.SURFACE))
 
+    def on_resize(e):
+        shown = watchlist.set_viewport(page.height)
+        if not shown: return
+        page.update()
+        fetch_watchlist_quotes(watchlist_generation, shown)
+
+    def toggle_compact():
+        shown = watchlist.set_compact(not watchlist.is_compact())
+        page.update()
+        fetch_watchlist_quotes(watchlist_generation, shown)
+
+    # 批次匯入 / 匯出
+    def import_watchlist(path, list_id):
+        """背景執行緒：解析檔案 → 批次報價驗證代碼 → 單一交易寫入；資料源無法連線時整批不匯入 (valid 回傳 None)"""
+        symbols = WatchlistIO.parse(WatchlistIO.read_file(path))
+        try:
+            valid = service.verify_symbols(symbols)
+        except Exception as e:
+            print(f"Import Verify Error: {e}")
+            return len(symbols), None, 0
+        if list_id == watchlist_model.list_id:
+            added = len(watchlist_model.add_many(valid))
+        else:  # 匯入期間已切換到其他清單，直接寫入原清單
+            added = db.add_many_to_watchlist(valid, list_id).result()
+        return len(symbols), len(valid), added
+
+    def on_import_picked(e):
+        if not e.files: return
+        path = e.files[0].path
+        if not path:
+            page.show_snack_bar(ft.SnackBar(content=ft.Text("此平台無法讀取本機檔案")))
+            return
+        page.show_snack_bar(ft.SnackBar(content=ft.Text("匯入中…")))
+        executor.submit(import_watchlist, path, watchlist_model.list_id, on_result=on_imported)
+
+    def on_imported(result):
+        if not result:
+            page.show_snack_bar(ft.SnackBar(content=ft.Text("匯入失敗，請確認檔案格式")))
+            return
+        total, valid, added = result
+        if valid is None:
+            page.show_snack_bar(ft.SnackBar(content=ft.Text("資料源暫時無法連線，未匯入任何代碼，請稍後再試")))
+            return
+        page.show_snack_bar(ft.SnackBar(content=ft.Text(f"已新增 {added} 檔 (無效代碼 {total - valid} 檔)")))
+
+    def on_export_picked(e):
+        if not e.path: return
+        try:
+            with open(e.path, "w", encoding="utf-8") as f:
+                f.write(WatchlistIO.dump(watchlist_model.symbols()))
+            page.show_snack_bar(ft.SnackBar(content=ft.Text("已匯出自選股")))
+        except OSError as ex:
+            page.show_snack_bar(ft.SnackBar(content=ft.Text(f"匯出失敗: {ex}")))
+
+    import_picker = ft.FilePicker(on_result=on_import_picked)
+    export_picker = ft.FilePicker(on_result=on_export_picked)
+    page.overlay.extend([import_picker, export_picker])
+
+    # 多清單切換 (快取/快照中已有的報價直接顯示，只補抓缺的)
+    dd_lists = ft.Dropdown(
+        width=200, dense=True, border_radius=12,
+        bgcolor=AppColors.SURFACE, color=AppColors.TEXT_MAIN, border_color=AppColors.SURFACE,
+        on_change=lambda e: switch_list(int(e.control.value))
+    )
+
+    def load_list_options():
+        dd_lists.options = [ft.dropdown.Option(key=str(list_id), text=name) for list_id, name in db.get_lists()]
+        dd_lists.value = str(watchlist_model.list_id)
+
+    def switch_list(list_id):
+        if list_id == watchlist_model.list_id: return
+        watchlist_model.load(list_id)  # reset 事件會重畫列表
+
+    txt_new_list = ft.TextField(hint_text="清單名稱 (例如 美股權值)", autofocus=True)
+
+    def create_list(e):
+        name = (txt_new_list.value or "").strip()
+        if not name: return
+        dlg_new_list.open = False
+        page.update()
+        # 寫入在背景提交，拿到新清單 id 後才切換
+        executor.submit(lambda: db.create_list(name).result(), on_result=on_list_created)
+
+    def on_list_created(list_id):
+        if list_id is None:
+            page.show_snack_bar(ft.SnackBar(content=ft.Text("清單名稱已存在")))
+            return
+        switch_list(list_id)
+        load_list_options()
+
+    dlg_new_list = ft.AlertDialog(
+        title=ft.Text("新增自選清單"),
+        content=txt_new_list,
+        actions=[ft.TextButton("建立", on_click=create_list)]
+    )
+
+    def open_new_list_dialog():
+        txt_new_list.value = ""
+        page.dialog = dlg_new_list
+        dlg_new_list.open = True
+        page.update()
+
+    load_list_options()
+
     view_watchlist = ft.Column([
         ft.Container(
-            padding=ft.padding.only(left=20, top=50, bottom=10),
-            content=ft.Text("My Watchlist", size=32, weight="900", color=AppColors.TEXT_MAIN)
+            padding=ft.padding.only(left=20, top=50, bottom=10, right=10),
+            content=ft.Row([
+                ft.Text("My Watchlist", size=32, weight="900", color=AppColors.TEXT_MAIN),
+                ft.Row([
+                    ft.IconButton(icon=ft.icons.UPLOAD_FILE, icon_color=AppColors.TEXT_SUB, tooltip="匯入清單 (CSV/TXT)",
+                                  on_click=lambda e: import_picker.pick_files(allowed_extensions=["csv", "txt"])),
+                    ft.IconButton(icon=ft.icons.DOWNLOAD, icon_color=AppColors.TEXT_SUB, tooltip="匯出清單",
+                                  on_click=lambda e: export_picker.save_file(file_name="watchlist.csv", allowed_extensions=["csv"])),
+                    ft.IconButton(icon=ft.icons.VIEW_HEADLINE, icon_color=AppColors.TEXT_SUB, tooltip="切換精簡列表",
+                                  on_click=lambda e: toggle_compact())
+                ], spacing=0)
+            ], alignment="spaceBetween")
+        ),
+        ft.Container(
+            padding=ft.padding.only(left=20, right=10),
+            content=ft.Row([
+                dd_lists,
+                ft.IconButton(icon=ft.icons.PLAYLIST_ADD, icon_color=AppColors.TEXT_SUB, tooltip="新增清單",
+                              on_click=lambda e: open_new_list_dialog())
+            ])
         ),
-        lv_watchlist
+        watchlist.list_view
     ], expand=True)
 
     # 2. 個股分析視圖
@@ -262,12 +2096,15 @@ def main(page: ft.Page):
     
     # 分析頁的內容容器
     chart_container = ft.Image(src_base64=None, fit=ft.ImageFit.CONTAIN, visible=False)
+    chart_box = ft.Container(content=chart_container, padding=10) # K線圖 (載入中顯示佔位)
     info_row = ft.Row(alignment="spaceBetween", wrap=True) # 基本面
+    tech_row = ft.Row(alignment="spaceBetween", wrap=True) # 技術指標 (與 K 線圖共用同一次計算)
     news_col = ft.Column(spacing=10) # 新聞
     
     # 分析頁頭部 (價格與收藏按鈕)
     lbl_detail_price = ft.Text("-", size=36, weight="bold")
     lbl_detail_change = ft.Text("-", size=16, weight="bold")
+    lbl_detail_stale = ft.Text("", size=12, color=AppColors.TEXT_SUB, visible=False)
     btn_fav = ft.IconButton(icon=ft.icons.STAR_BORDER, icon_size=30, on_click=lambda e: toggle_fav())
     
     header_section = ft.Container(
@@ -278,7 +2115,7 @@ def main(page: ft.Page):
             ft.Row([txt_search, ft.IconButton(ft.icons.SEARCH, on_click=lambda e: run_analysis(txt_search.value))]),
             ft.Divider(height=20, color="transparent"),
             ft.Row([
-                ft.Column([lbl_detail_price, lbl_detail_change]),
+                ft.Column([lbl_detail_price, lbl_detail_change, lbl_detail_stale]),
                 btn_fav
             ], alignment="spaceBetween")
         ])
@@ -292,8 +2129,12 @@ def main(page: ft.Page):
         label_color=AppColors.PRIMARY,
         unselected_label_color=AppColors.TEXT_SUB,
         tabs=[
-            ft.Tab(text="K線圖", content=ft.Container(content=chart_container, padding=10)),
-            ft.Tab(text="基本面", content=ft.Container(content=info_row, padding=20)),
+            ft.Tab(text="K線圖", content=chart_box),
+            ft.Tab(text="基本面", content=ft.Container(padding=20, content=ft.Column([
+                info_row,
+                ft.Text("技術指標", size=14, weight="bold", color=AppColors.TEXT_SUB),
+                tech_row
+            ], scroll="auto"))),
             ft.Tab(text="新聞", content=ft.Container(content=ft.Column([news_col], scroll="auto"), padding=20)),
         ],
         expand=True,
@@ -313,21 +2154,14 @@ def main(page: ft.Page):
     def toggle_fav():
         if not current_symbol: return
         
-        watchlist = db.get_watchlist()
-        if current_symbol in watchlist:
-            db.remove_from_watchlist(current_symbol)
-            btn_fav.icon = ft.icons.STAR_BORDER
-            btn_fav.icon_color = AppColors.TEXT_SUB
-            page.show_snack_bar(ft.SnackBar(content=ft.Text("已取消收藏")))
-        else:
-            db.add_to_watchlist(current_symbol)
-            btn_fav.icon = ft.icons.STAR
-            btn_fav.icon_color = "yellow"
+        # 星號與列表由 on_watchlist_changed 更新
+        if watchlist_model.toggle(current_symbol):
             page.show_snack_bar(ft.SnackBar(content=ft.Text("已加入收藏")))
-        page.update()
+        else:
+            page.show_snack_bar(ft.SnackBar(content=ft.Text("已取消收藏")))
 
     def update_fav_icon(symbol):
-        if symbol in db.get_watchlist():
+        if symbol in watchlist_model:
             btn_fav.icon = ft.icons.STAR
             btn_fav.icon_color = "yellow"
         else:
@@ -358,14 +2192,24 @@ def main(page: ft.Page):
         tabs_content.visible = False
         lbl_detail_price.value = "載入中..."
         lbl_detail_change.value = ""
+        lbl_detail_stale.visible = False
         btn_fav.disabled = True
         page.update()
 
+        # 網路與繪圖工作全部丟到背景執行緒，UI 保持可操作
+        executor.submit(load_analysis_data, symbol)
+
+    def load_analysis_data(symbol):
+        """背景執行緒：先取報價，再平行派發重型資料"""
+        def is_current():
+            return symbol == current_symbol  # 使用者已改查其他代碼則丟棄結果
+
         # 1. 獲取報價 (Quote)
-        quote = StockService.get_quote(symbol)
+        quote = service.get_quote(symbol)
+        if not is_current(): return
         if not quote:
             lbl_detail_price.value = "查無資料"
-            lbl_detail_change.value = "請確認代碼"
+            lbl_detail_change.value = "資料源暫時無法連線" if service.breaker.is_open else "請確認代碼"
             loading_indicator.visible = False
             page.update()
             return
@@ -376,22 +2220,78 @@ def main(page: ft.Page):
         lbl_detail_change.value = f"{quote['change']:+.2f} ({quote['pct']:+.2f}%)"
         lbl_detail_change.color = color
         lbl_detail_price.color = color
+        if quote.get("stale"):
+            # 上游失敗或斷路中：顯示的是最後已知報價
+            as_of = datetime.datetime.fromtimestamp(quote["as_of"]).strftime("%m/%d %H:%M")
+            lbl_detail_stale.value = f"⏱ 離線資料 (截至 {as_of})"
+            lbl_detail_stale.visible = True
         
         update_fav_icon(symbol)
         btn_fav.disabled = False
-        page.update()
 
         # 2. 平行載入重型資料 (Chart, Details, News)
-        # 為了保持 UI 響應，我們分步更新
-        
-        # A. K線圖
-        b64 = StockService.generate_chart_image(symbol)
-        if b64:
-            chart_container.src_base64 = b64
+        # 三者同時送出，各分頁資料一到就各自填入，不互相等待
+        chart_box.content = build_tab_placeholder()
+        info_row.controls = [build_tab_placeholder()]
+        tech_row.controls = [build_tab_placeholder()]
+        news_col.controls = [build_tab_placeholder()]
+        loading_indicator.visible = False
+        tabs_content.visible = True
+        page.update()
+
+        executor.submit(load_chart, symbol, on_result=lambda chart: show_chart(symbol, chart))
+        executor.submit(service.get_details, symbol, on_result=lambda details: show_details(symbol, details))
+        executor.submit(service.get_news, symbol, on_result=lambda items: show_news(symbol, items))
+
+    def build_tab_placeholder():
+        return ft.Container(
+            content=ft.ProgressRing(width=24, height=24, color=AppColors.PRIMARY),
+            alignment=ft.alignment.center, padding=30, width=400
+        )
+
+    # A. K線圖 + 技術指標
+    def load_chart(symbol):
+        """背景執行緒：依 CHART_BACKEND 產出原生圖表控制項或 PNG Base64，並附上最新指標值"""
+        df, ind = service.get_technicals(symbol)
+        if df.empty: return None, None
+        if CHART_BACKEND == "native":
+            return CandleChart(symbol, df, ind), Indicators.latest(ind)
+        return service.generate_chart_image(symbol, (df, ind)), Indicators.latest(ind)
+
+    def show_chart(symbol, result):
+        if symbol != current_symbol: return
+        chart, latest = result or (None, None)
+        show_tech_stats(latest)
+        if isinstance(chart, str):  # PNG Base64
+            chart_container.src_base64 = chart
             chart_container.visible = True
-        
-        # B. 基本面
-        details = StockService.get_details(symbol)
+            chart_box.content = chart_container
+        elif chart:
+            chart_box.content = chart
+        else:
+            chart_box.content = ft.Text("暫無K線資料", color=AppColors.TEXT_SUB)
+
+    def show_tech_stats(latest):
+        if not latest:
+            tech_row.controls = [ft.Text("暫無指標資料", color=AppColors.TEXT_SUB)]
+            return
+
+        def fmt(name):
+            val = latest.get(name)
+            return "N/A" if val is None else f"{val:.2f}"
+
+        tech_row.controls = [
+            build_stat_box("MA20", fmt("sma_20")),
+            build_stat_box("RSI(14)", fmt("rsi_14")),
+            build_stat_box("MACD柱", fmt("macd_hist")),
+            build_stat_box("布林上軌", fmt("bb_upper")),
+            build_stat_box("布林下軌", fmt("bb_lower")),
+            build_stat_box("ATR(14)", fmt("atr_14")),
+        ]
+
+    # B. 基本面
+    def show_details(symbol, details):
+        if symbol != current_symbol: return
         info_row.controls.clear()
         if details:
             # 格式化市值 (億)
@@ -406,8 +2306,9 @@ def main(page: ft.Page):
                 ft.Container(width="100%", content=ft.Text(f"產業: {details['sector']}", color=AppColors.TEXT_SUB, size=12, text_align="center"))
             ]
 
-        # C. 新聞
-        news_items = StockService.get_news(symbol)
+    # C. 新聞
+    def show_news(symbol, news_items):
+        if symbol != current_symbol: return
         news_col.controls.clear()
         if news_items:
             for n in news_items:
@@ -431,11 +2332,6 @@ def main(page: ft.Page):
         else:
             news_col.controls.append(ft.Text("暫無相關新聞", color=AppColors.TEXT_SUB))
 
-        # 完成載入
-        loading_indicator.visible = False
-        tabs_content.visible = True
-        page.update()
-
     def load_analysis_page(symbol):
         """從自選列表點擊跳轉"""
         page.navigation_bar.selected_index = 1
@@ -471,8 +2367,25 @@ def main(page: ft.Page):
     )
 
     # --- 啟動 ---
+    # 斷線 (重新整理、網路中斷) 後同一工作階段會再連上：只暫停輪詢；工作階段結束才釋放本工作階段的資源 (db / service 屬於行程)
+    def on_disconnect(e):
+        quote_streamer.stop()
+
+    def on_connect(e):
+        quote_streamer.start()
+
+    def on_close(e):
+        quote_streamer.stop()
+        executor.shutdown()
+
+    page.on_disconnect = on_disconnect
+    page.on_connect = on_connect
+    page.on_close = on_close
+    page.on_resize = on_resize
+    watchlist.set_viewport(page.height)  # 首次繪製前就依視窗高度決定列數，不等第一次捲動
     page.add(ft.Stack([view_watchlist, view_analysis]))
     refresh_watchlist()
+    quote_streamer.start()
 
 if __name__ == "__main__":
     ft.app(target=main)
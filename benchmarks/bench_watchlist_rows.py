@@ -0,0 +1,73 @@
+"""自選股列表列元件基準測試：比較 StockCard 與 CompactStockRow 每列的記憶體、控制項數與建構成本
+
+用法: python benchmarks/bench_watchlist_rows.py [列數]
+"""
+import importlib.util
+import os
+import sys
+import time
+import tracemalloc
+
+APP_PATH = os.path.join(os.path.dirname(__file__), "..", "AlphaPulse Ultimate.py")
+
+
+def load_app():
+    spec = importlib.util.spec_from_file_location("alphapulse", APP_PATH)
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+    return app
+
+
+def make_quote(app, i):
+    price = 100 + i % 50
+    return app.StockService.build_quote(f"{1000 + i}.TW", price, price - 1.5)
+
+
+def count_controls(control):
+    """遞迴計算控制項樹的節點數 (UserControl 需先 build)"""
+    children = control._get_children() if hasattr(control, "_get_children") else []
+    return 1 + sum(count_controls(c) for c in children if c is not None)
+
+
+def build_card(app, i):
+    card = app.StockCard(f"{1000 + i}.TW", make_quote(app, i), print, print)
+    card.controls = [card.build()]  # 模擬 Flet 掛上頁面時的 build
+    return card
+
+
+def build_compact(app, i, on_click):
+    return app.CompactStockRow(f"{1000 + i}.TW", make_quote(app, i), on_click, on_click)
+
+
+def measure(name, factory, n, quotes):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    t0 = time.perf_counter()
+    rows = [factory(i) for i in range(n)]
+    elapsed = time.perf_counter() - t0
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    mem = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    root = rows[0].control if hasattr(rows[0], "control") else rows[0]
+
+    t0 = time.perf_counter()
+    for i, row in enumerate(rows):
+        row.set_quote(quotes[i % len(quotes)])
+    update = time.perf_counter() - t0
+
+    print(f"{name:<16} controls/row={count_controls(root):>3}  "
+          f"mem/row={mem / n / 1024:7.2f} KiB  build/row={elapsed / n * 1e6:7.1f} µs  "
+          f"set_quote/row={update / n * 1e6:6.1f} µs")
+    return rows
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    app = load_app()
+    quotes = [make_quote(app, i) for i in range(100)]
+    shared_click = lambda e: None
+
+    print(f"rows={n}")
+    measure("StockCard", lambda i: build_card(app, i), n, quotes)
+    measure("CompactStockRow", lambda i: build_compact(app, i, shared_click), n, quotes)